@@ -1,9 +1,71 @@
-import subprocess
-from flask import Blueprint, json, request
-from .auth import authorization_with_user
+import itertools
+from flask import Blueprint, Response, json, request
+from .swift import LISTING_PAGE_SIZE, get_container_page, iter_container_pages
 
 object_bp = Blueprint('object', __name__)
 
+#limite de objetos por pagina que acepta swift en un listado
+LISTING_MAX_LIMIT = 10000
+
+#convertir un objeto del listado de swift al formato de "openstack object list --long"
+def to_long_format(obj):
+    return {
+        "Name": obj.get("name"),
+        "Bytes": obj.get("bytes"),
+        "Hash": obj.get("hash"),
+        "Content Type": obj.get("content_type"),
+        "Last Modified": obj.get("last_modified"),
+    }
+
+#generar la respuesta json pagina por pagina conforme se leen de swift
+#si una pagina falla despues de empezar a responder ya no se puede cambiar el status 200,
+#el json se cierra con "error" para que el cliente no tome el listado incompleto como completo
+def stream_listing(message, pages, transform=None):
+    yield '{"message": ' + json.dumps(message) + ', "data": ['
+    first = True
+    try:
+        for page in pages:
+            for obj in page:
+                if transform:
+                    obj = transform(obj)
+                yield ('' if first else ',') + json.dumps(obj)
+                first = False
+    except Exception as e:
+        print(f"Error al listar objetos: {e}")
+        yield '], "error": "Error al listar objetos, el listado esta incompleto"}'
+        return
+    yield ']}'
+
+#responder el listado de un contenedor
+#si se recibe "limit" se regresa solo una pagina con "next_marker" para pedir la siguiente
+#si no, se regresan todas las paginas en una respuesta que se va enviando conforme llegan
+def listing_response(message, data, user_id, project, prefix=None, transform=None):
+    delimiter = data.get("delimiter")
+    marker = data.get("marker")
+    limit = data.get("limit")
+
+    if limit:
+        # swift no regresa mas de LISTING_MAX_LIMIT objetos por pagina, la pagina se compara contra el limite ya ajustado
+        try:
+            limit = min(int(limit), LISTING_MAX_LIMIT)
+        except (TypeError, ValueError):
+            return {"error": "limit debe ser un numero entero"}, 400
+        if limit < 1:
+            return {"error": "limit debe ser mayor a 0"}, 400
+        page = get_container_page(user_id, project, user_id, prefix, delimiter, marker, limit)
+        next_marker = None
+        if len(page) == limit:
+            next_marker = page[-1].get("name", page[-1].get("subdir"))
+        if transform:
+            page = [transform(obj) for obj in page]
+        return {"message": message, "data": page, "next_marker": next_marker}
+
+    pages = iter_container_pages(user_id, project, user_id, prefix, delimiter, marker)
+    # Leer la primera pagina antes de responder para poder reportar errores de autenticacion
+    first_page = next(pages, [])
+    pages = itertools.chain([first_page], pages)
+    return Response(stream_listing(message, pages, transform), mimetype='application/json')
+
 #ruta para listar los objetos
 #como se mandan los datos
 #curl -X GET http://192.168.1.104:5000/object/1
@@ -18,68 +80,25 @@ def list_objects():
 
     print("user_id: ", user_id)
     print("project: ", project)
-    # project_name = str(data["project_name"])
     try:
-        authorization_with_user(user_id, project)  # Crear la autorización para el usuario en ese proyecto
-        # Listar los objetos en el contenedor
-        # Ejecutar el comando openstack con captura de stdout y stderr
-        user_data = subprocess.run(
-            [
-                "openstack", 
-                "object", 
-                "list",
-                "--long",
-                "-f",
-                "json",
-                user_id
-            ],
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True  # Esto decodifica automáticamente la salida a cadena de texto
-        )
-        # user_data.stdout ya es una cadena de texto gracias a text=True
-        user_info = json.loads(user_data.stdout)
+        # Listar los objetos en el contenedor directamente desde swift
+        return listing_response("objetos listados con exito", data, user_id, project, transform=to_long_format)
 
-        return {"message": "objetos listados con exito", "data": user_info}
-    
-    except subprocess.CalledProcessError as e:
+    except Exception as e:
         print(f"Error al listar objetos: {e}")
         return {"error": "Error al listar objetos"}
 
 #ruta para listar los objetos de una carpeta    
 @object_bp.route('/path', methods = ['POST'])
 def list_object_by_path():
-    #swift list 2018630522 -l  --prefix /home -j
     data = request.get_json()
     user_id = str(data["user_id"])
     project = str(data["project"])
     path = str(data["path"])
-    # project_name = str(data["project_name"])
     try:
-        authorization_with_user(user_id, project)  # Crear la autorización para el usuario en ese proyecto
-        # Listar los objetos en el contenedor
-        # Ejecutar el comando openstack con captura de stdout y stderr
-        user_data = subprocess.run(
-            [
-                "swift", 
-                "list", 
-                user_id,
-                "-l",
-                "--prefix",
-                path,
-                "-j"
-            ],
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True  # Esto decodifica automáticamente la salida a cadena de texto
-        )
-        # user_data.stdout ya es una cadena de texto gracias a text=True
-        user_info = json.loads(user_data.stdout)
+        # Listar los objetos del contenedor que empiezan con la ruta
+        return listing_response(f"objetos de la carpeta {path} listados con exito", data, user_id, project, prefix=path)
 
-        return {"message": "objetos de la carpeta {path} listados con exito", "data": user_info}
-    
-    except subprocess.CalledProcessError as e:
+    except Exception as e:
         print(f"Error al listar objetos: {e}")
-        return {"error": "Error al listar objetos"}
\ No newline at end of file
+        return {"error": "Error al listar objetos"}
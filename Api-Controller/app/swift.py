@@ -0,0 +1,138 @@
+#consultas directas al api de swift (sin el cliente de linea de comandos)
+import threading
+from datetime import datetime, timedelta, timezone
+import requests
+
+KEYSTONE_URL = "http://controller:5000/v3"
+
+# Objetos por pagina al listar un contenedor (swift permite hasta 10000)
+LISTING_PAGE_SIZE = 1000
+
+# Segundos antes de la expiracion en los que el token se renueva
+TOKEN_REFRESH_MARGIN = 300
+
+# Tiempos de espera en segundos (conexion, lectura)
+TIMEOUT = (5, 60)
+
+# Sesion compartida para reutilizar las conexiones a keystone y swift
+session = requests.Session()
+
+# Cache de credenciales: (usuario, proyecto) -> (token, storage_url, expires_at)
+_credentials = {}
+# Un candado por llave para que varias peticiones simultaneas del mismo usuario hagan una sola autenticacion
+# sin bloquear la autenticacion de los demas usuarios
+_credentials_locks = {}
+_credentials_locks_guard = threading.Lock()
+
+def _get_credentials_lock(key):
+    with _credentials_locks_guard:
+        lock = _credentials_locks.get(key)
+        if lock is None:
+            lock = threading.Lock()
+            _credentials_locks[key] = lock
+        return lock
+
+#obtener las credenciales de la cache si aun no estan por expirar
+def _get_cached_credentials(key):
+    cached = _credentials.get(key)
+    if cached and cached[2] - timedelta(seconds=TOKEN_REFRESH_MARGIN) > datetime.now(timezone.utc):
+        return cached[0], cached[1]
+    return None
+
+#contraseña del usuario igual que en authorization_with_user
+def get_password(user):
+    if user == "api_creator":
+        return 'openpwd1'
+    return user
+
+#autenticar en keystone y obtener el token y la url de swift del catalogo
+def authenticate(user, project):
+    data = {
+        "auth": {
+            "identity": {
+                "methods": ["password"],
+                "password": {
+                    "user": {
+                        "domain": {"name": "Default"},
+                        "name": user,
+                        "password": get_password(user)
+                    }
+                }
+            },
+            "scope": {
+                "project": {
+                    "domain": {"name": "Default"},
+                    "name": project
+                }
+            }
+        }
+    }
+    response = session.post(f"{KEYSTONE_URL}/auth/tokens", json=data, timeout=TIMEOUT)
+    if response.status_code != 201:
+        raise Exception(f"Error en la autenticación: {response.status_code} - {response.text}")
+
+    token_info = response.json()["token"]
+    storage_url = None
+    for service in token_info.get("catalog", []):
+        if service["type"] == "object-store":
+            for endpoint in service["endpoints"]:
+                if endpoint["interface"] == "public":
+                    storage_url = endpoint["url"]
+    if not storage_url:
+        raise Exception("No se encontró el endpoint de swift en el catálogo")
+
+    expires_at = datetime.fromisoformat(token_info["expires_at"].replace("Z", "+00:00"))
+    return response.headers["X-Subject-Token"], storage_url, expires_at
+
+#obtener token y url de swift de la cache o autenticando de nuevo
+def get_credentials(user, project):
+    key = (user, project)
+    cached = _get_cached_credentials(key)
+    if cached:
+        return cached
+
+    with _get_credentials_lock(key):
+        # Otra peticion pudo haber autenticado mientras se esperaba el candado
+        cached = _get_cached_credentials(key)
+        if cached:
+            return cached
+        _credentials[key] = authenticate(user, project)
+        return _credentials[key][0], _credentials[key][1]
+
+#obtener una pagina del listado de un contenedor
+def get_container_page(user, project, container, prefix=None, delimiter=None, marker=None, limit=LISTING_PAGE_SIZE):
+    params = {"format": "json", "limit": limit}
+    if prefix:
+        params["prefix"] = prefix
+    if delimiter:
+        params["delimiter"] = delimiter
+    if marker:
+        params["marker"] = marker
+
+    for attempt in range(2):
+        token, storage_url = get_credentials(user, project)
+        response = session.get(f"{storage_url}/{container}", params=params,
+                               headers={"X-Auth-Token": token}, timeout=TIMEOUT)
+        if response.status_code == 401 and attempt == 0:
+            # Token rechazado, se descarta y se vuelve a autenticar
+            _credentials.pop((user, project), None)
+            continue
+        break
+
+    if response.status_code == 204:
+        return []
+    if response.status_code != 200:
+        raise Exception(f"Error al listar el contenedor: {response.status_code} - {response.text}")
+    return response.json()
+
+#recorrer todas las paginas del listado de un contenedor usando marker
+def iter_container_pages(user, project, container, prefix=None, delimiter=None, marker=None):
+    while True:
+        page = get_container_page(user, project, container, prefix, delimiter, marker)
+        if not page:
+            return
+        yield page
+        if len(page) < LISTING_PAGE_SIZE:
+            return
+        # Con delimiter las subcarpetas vienen como {"subdir": ...}
+        marker = page[-1].get("name", page[-1].get("subdir"))
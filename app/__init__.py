@@ -1,4 +1,5 @@
 # app/__init__.py
+import os
 from flask import Flask
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
@@ -17,6 +18,7 @@ from .entitys.enrollment import enrollment_bp
 from .entitys.subject import subject_bp
 
 from .file.file import file_bp
+from .file.reconciler import start_reconciler
 
 from .logs.events import logs_bp
 from .notices.notice import notice_bp
@@ -37,6 +39,8 @@ def create_app():
     # Establece la clave secreta para firmar JWT
     app.config['JWT_SECRET_KEY'] = 'd822d96ef56c589c3904a372381fa378'  # Cambia esto por una clave secreta única
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=2)  # Duración de los tokens de 2 dias
+    # Reconciliación del índice de objetos con swift, solo si se activa (RACOON_INDEX_RECONCILE=1)
+    app.config['INDEX_RECONCILE'] = os.environ.get('RACOON_INDEX_RECONCILE') == '1'
     # Inicializa Migrate
     migrate = Migrate(app, db)
     
@@ -65,4 +69,7 @@ def create_app():
     
     app.register_blueprint(openstack_auth_bp, url_prefix='/openstack')
     app.register_blueprint(upload_bp, url_prefix='/upload')
+
+    # Inicia la reconciliación del índice de objetos con swift en segundo plano (si esta activada)
+    start_reconciler(app)
     return app
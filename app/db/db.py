@@ -141,6 +141,78 @@ class APILog(db.Model):
     def __repr__(self):
         return f'<APILog {self.id}>'
 
+# Modelo del índice local de objetos de swift
+# account es el proyecto de keystone (cuenta de swift), container el identificador del usuario
+# name es el nombre del objeto sin la barra inicial, las carpetas virtuales terminan en "/"
+# los largos de las columnas mantienen la llave única dentro del límite de índices de MySQL
+class ObjectIndex(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('account', 'container', 'name', name='uq_object_index_name'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    account = db.Column(db.String(100), nullable=False)
+    container = db.Column(db.String(100), nullable=False)
+    name = db.Column(db.String(500), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False, default=0)
+    # etag (md5 de swift) y sha256 (metadato X-Object-Meta-Sha256) permiten encontrar archivos con el mismo contenido
+    etag = db.Column(db.String(64), index=True)
+    sha256 = db.Column(db.String(64), index=True)
+    content_type = db.Column(db.String(255))
+    last_modified = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<ObjectIndex {self.account}/{self.container}/{self.name}>'
+
+# Modelo de los contenedores que ya se cargaron completos en el índice
+class ContainerIndex(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('account', 'container', name='uq_container_index'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    account = db.Column(db.String(100), nullable=False)
+    container = db.Column(db.String(100), nullable=False)
+    indexed_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+    def __repr__(self):
+        return f'<ContainerIndex {self.account}/{self.container}>'
+
+# Modelo de sesión de subida por partes
+# cada parte se guarda en swift como segmento y al finalizar se confirma un manifiesto SLO
+class UploadSession(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    account = db.Column(db.String(100), nullable=False)
+    container = db.Column(db.String(100), nullable=False)
+    user_scope = db.Column(db.String(255), nullable=False)
+    file_path = db.Column(db.String(500), nullable=False, default='')
+    file_name = db.Column(db.String(255), nullable=False)
+    file_size = db.Column(db.BigInteger, nullable=False)
+    chunk_size = db.Column(db.Integer, nullable=False)
+    total_chunks = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='abierta')
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+    def __repr__(self):
+        return f'<UploadSession {self.id} - {self.file_name}>'
+
+# Modelo de las partes (segmentos) recibidas de una sesión de subida
+class UploadChunk(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('session_id', 'chunk_index', name='uq_upload_chunk'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    session_id = db.Column(db.String(32), db.ForeignKey('upload_session.id'), nullable=False)
+    chunk_index = db.Column(db.Integer, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    etag = db.Column(db.String(64))
+    received_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+    def __repr__(self):
+        return f'<UploadChunk {self.session_id} - {self.chunk_index}>'
+
 # Función para agregar datos por defecto
 def insert_default_data():
     if Role.query.count() == 0:
@@ -0,0 +1,64 @@
+#cache de los listados de contenedores para no consultar swift en cada navegacion
+import threading
+import time
+from collections import OrderedDict
+
+# Segundos que un listado se considera vigente
+LISTING_CACHE_TTL = 30
+# Maximo de listados guardados, al superarlo se descarta el menos usado
+LISTING_CACHE_SIZE = 256
+
+# Cache con tiempo de vida y descarte del menos usado recientemente (LRU)
+class ListingCache:
+    def __init__(self, ttl=LISTING_CACHE_TTL, max_entries=LISTING_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    #las llaves se normalizan a texto porque el identificador puede llegar como numero
+    def key(self, container, project):
+        return (str(container), str(project))
+
+    #validator son los metadatos del contenedor al consultar, si no coinciden con los guardados el listado ya no es vigente
+    def get(self, container, project, validator=None):
+        key = self.key(container, project)
+        with self.lock:
+            entry = self.entries.get(key)
+            stale = entry is not None and validator is not None and entry[2] is not None and entry[2] != validator
+            if entry is None or entry[0] < time.monotonic() or stale:
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, container, project, value, validator=None):
+        key = self.key(container, project)
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value, validator)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, container, project):
+        key = self.key(container, project)
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0,
+            }
+
+# Cache compartida por el proceso
+listing_cache = ListingCache()
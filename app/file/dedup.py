@@ -0,0 +1,55 @@
+#subidas por contenido: si el contenedor del usuario ya tiene un objeto con el mismo contenido se copia en swift sin transferir los bytes
+#el cliente (o el hash calculado al recibir) indica el tamaño y el sha256 o md5 del archivo
+#los candidatos salen del índice local, solo del contenedor del propio usuario, y se confirman con un HEAD antes de copiar
+from ..openstack.load import copy_existing_object
+from ..openstack.object import head_object
+from .cache import listing_cache
+from .index import find_duplicate_objects, index_remote_object
+
+#saber si las cabeceras de un objeto (HEAD) corresponden al contenido indicado
+#el ETag de un SLO no es el md5 de su contenido, para esos solo sirve el sha256 guardado como metadato
+def content_matches(headers, size, sha256=None, md5=None):
+    if headers is None or str(headers.get('Content-Length')) != str(size):
+        return False
+    if sha256 and headers.get('X-Object-Meta-Sha256'):
+        return headers['X-Object-Meta-Sha256'].lower() == sha256.lower()
+    if md5 and headers.get('X-Static-Large-Object') != 'True':
+        return (headers.get('Etag') or '').strip('"').lower() == md5.lower()
+    return False
+
+#buscar el objeto en el contenedor, con y sin la barra inicial con la que se guardan algunos objetos
+def head_candidate(user, user_scope, project, name):
+    for object_name in [name, '/' + name]:
+        headers = head_object(user, user_scope, project, object_name)
+        if headers is not None:
+            return object_name, headers
+    return None, None
+
+#satisfacer una subida con una copia en el servidor de un objeto del mismo contenedor con el mismo contenido
+#regresa True si el archivo quedó subido o False si no hay duplicado y el cliente debe subir el archivo
+def deduplicate_upload(user, user_scope, project, file_path, file_name, size, sha256=None, md5=None):
+    if not sha256 and not md5:
+        return False
+    object_name = file_name if file_path == '' else '/' + file_path + '/' + file_name
+
+    # El destino ya tiene el mismo contenido
+    if content_matches(head_object(user, user_scope, project, object_name), size, sha256, md5):
+        print(f"'{object_name}' ya tiene el mismo contenido, no se sube de nuevo")
+        return True
+
+    for row in find_duplicate_objects(project, user, size, sha256, md5):
+        try:
+            source_name, headers = head_candidate(user, user_scope, project, row.name)
+            if not content_matches(headers, size, sha256, md5):
+                continue
+            copy_existing_object(user, user_scope, project, user, source_name, file_path, file_name,
+                                 headers.get('X-Static-Large-Object') == 'True')
+        except Exception as e:
+            print(f"Error al copiar el duplicado '{row.name}': {e}")
+            continue
+
+        index_remote_object(user, user_scope, project, object_name)
+        listing_cache.invalidate(user, project)
+        print(f"'{object_name}' copiado de '{row.name}' sin transferir el contenido")
+        return True
+    return False
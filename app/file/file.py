@@ -1,27 +1,179 @@
 # lógica de manejo de archivos
 # Versión 0.4 - Proporcionar directorios y rutas seguras
+import hashlib
 import json
 import os, base64
-import shutil
 import threading
 import uuid
-import zipfile
-from flask import Blueprint, after_this_request, request, jsonify, send_file, abort
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from flask import Blueprint, Response, current_app, request, jsonify, abort
 from pathlib import Path
 from flask_jwt_extended import get_jwt_identity, jwt_required
-from ..db.db import Subject, User 
-from ..db.path import store_path, zip_path
+from ..db.db import Enrollment, Student, Subject, User 
 from ..logs.logs import log_api_request
 from .path_functions import *
-from ..openstack.load import delete_path_openstack, download_file_openstack, download_path_openstack, upload_file_openstack
-from ..openstack.object import get_object_list, delete, move_data, move_path_to_path
-from ..openstack.conteners import create_path, size_container
+from .cache import listing_cache
+from .reconciler import index_reconciler
+from .dedup import deduplicate_upload
+from .sessions import close_upload_session, create_upload_session, finalize_session_object, get_file_sha256, get_missing_chunks, get_session_status, get_upload_session, purge_expired_sessions, write_chunk, UPLOAD_CHUNK_SIZE
+from .index import get_indexed_container_size, get_shared_segment_names, get_indexed_object_list, index_listing, index_remote_object, move_indexed_objects, remove_indexed_objects
+from ..openstack.load import delete_path_openstack, stream_file_openstack, stream_path_zip_openstack, upload_file_openstack, upload_stream_openstack
+from ..openstack.object import DIRECTORY_PAGE_SIZE, get_object_list, get_object_list_by_path, get_object_page_by_path, get_directory_children, iter_object_pages, delete, move_data, move_path_to_path
+from ..openstack.conteners import create_path, head_container, size_container, summarize_container
 
 file_bp = Blueprint('file', __name__)
 
 # Tamaño máximo permitido para archivos/chunks (en bytes)
 MAX_FILE_SIZE = 500 * 1024 * 1024  # 500 MB
 
+# Contenedores de alumnos que se listan al mismo tiempo en el resumen de una materia
+SUBJECT_LISTING_WORKERS = 8
+
+# Resultados por página de la búsqueda
+SEARCH_PAGE_SIZE = 100
+SEARCH_MAX_PAGE_SIZE = 1000
+
+# Tamaño de los bloques con los que se reenvian las descargas de swift al cliente
+DOWNLOAD_CHUNK_SIZE = 64 * 1024  # 64 KB
+
+# Cabeceras de la respuesta de swift que se reenvian al cliente
+# el cuerpo se reenvia sin decodificar, por lo que Content-Length corresponde a Content-Encoding
+PASSTHROUGH_HEADERS = ['Content-Length', 'Content-Type', 'Content-Encoding', 'Content-Range', 'Accept-Ranges', 'ETag', 'Last-Modified']
+
+# Cabeceras del cliente que se reenvian a swift para descargas parciales y condicionales
+CONDITIONAL_HEADERS = ['Range', 'If-Range', 'If-None-Match', 'If-Modified-Since']
+
+# Hashes acumulados de las subidas por chunks en curso {archivo temporal: {"next", "md5", "sha256"}}
+# permiten verificar el archivo completo y mandar su ETag a swift sin volver a leerlo
+chunk_hashes = {}
+chunk_hashes_lock = threading.Lock()
+
+# Función que obtiene las cabeceras de rango y condicionales de la petición actual
+def get_conditional_headers():
+    return {name: request.headers[name] for name in CONDITIONAL_HEADERS if name in request.headers}
+
+# Función que reenvia al cliente el cuerpo de una respuesta de swift por bloques
+def passthrough_response(swift_response, file_name):
+    print("status de swift: ", swift_response.status_code)
+    if swift_response.status_code == 404:
+        swift_response.close()
+        return jsonify({"error": "El archivo no existe"}), 404
+    if swift_response.status_code not in [200, 206, 304, 416]:
+        swift_response.close()
+        raise Exception(f"Error al descargar el archivo: {swift_response.status_code}")
+
+    headers = {name: swift_response.headers[name] for name in PASSTHROUGH_HEADERS if name in swift_response.headers}
+
+    # 304 (sin cambios) y 416 (rango invalido) no llevan el contenido del archivo
+    if swift_response.status_code in [304, 416]:
+        swift_response.close()
+        headers.pop('Content-Length', None)
+        return Response(status=swift_response.status_code, headers=headers)
+
+    headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(os.path.basename(file_name))}"
+
+    # Se leen los bytes tal como los manda swift, iter_content descomprimiria un objeto con Content-Encoding
+    def generate():
+        try:
+            for chunk in swift_response.raw.stream(DOWNLOAD_CHUNK_SIZE, decode_content=False):
+                yield chunk
+        finally:
+            swift_response.close()
+
+    return Response(generate(), status=swift_response.status_code, headers=headers, direct_passthrough=True)
+
+# Función que obtiene el tamaño de un archivo recibido sin leerlo
+def get_stream_size(stream):
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size
+
+# Función que obtiene el listado de un contenedor desde la cache, el índice local o swift
+# la primera vez que se lista un contenedor desde swift se carga en el índice
+# con scope se consultan los metadatos actuales del contenedor (HEAD):
+# si cambiaron desde que se guardó el listado en cache se vuelve a cargar
+# y si no coinciden con el índice (o el índice ya es viejo) el listado se toma de swift y se vuelve a indexar
+def get_cached_object_list(container, project, scope=None):
+    headers = head_container(container, scope, project) if scope else None
+    validator = get_container_validator(headers)
+    object_list = listing_cache.get(container, project, validator)
+    if object_list is None:
+        object_list = get_indexed_object_list(project, container, headers)
+        if object_list is None:
+            object_list = get_object_list(container, project)['data']
+            index_listing(project, container, object_list)
+        listing_cache.put(container, project, object_list, validator)
+    return object_list
+
+# Función que obtiene el swift_scope del proyecto (materia) o el del usuario si es su espacio personal
+def get_listing_scope(project, user=None):
+    subject = Subject.query.filter_by(subject_name=str(project)).first()
+    if subject:
+        return subject.swift_scope
+    return user.openstack_id if user else None
+
+# Función que arma con los metadatos del contenedor (HEAD) el validador del listado en cache
+# detecta las escrituras hechas por otros procesos antes de que venza la cache
+def get_container_validator(headers):
+    if headers is None:
+        return None
+    return "-".join([
+        headers.get('X-Container-Object-Count', ''),
+        headers.get('X-Container-Bytes-Used', ''),
+        headers.get('Last-Modified', headers.get('X-Timestamp', '')),
+    ])
+
+# Función que calcula el ETag del listado que se va a responder
+# se calcula sobre el mismo listado que se transforma, asi un 304 siempre corresponde a lo que el cliente ya tiene
+# e incluye sobrescrituras del mismo tamaño y movimientos que no cambian los metadatos del contenedor
+def get_listing_etag(object_list):
+    digest = hashlib.md5()
+    for item in object_list:
+        digest.update(json.dumps([item.get("Name"), item.get("Bytes"), item.get("Hash"), item.get("Last Modified")]).encode('utf-8'))
+    return digest.hexdigest()
+
+# Función que responde la estructura completa del contenedor
+# si el ETag del cliente (If-None-Match) coincide se responde 304 sin transformar ni serializar el listado
+def structure_response(container, project, scope):
+    object_list = get_cached_object_list(container, project, scope)
+    etag = get_listing_etag(object_list)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    structure = transform_to_structure(object_list)
+    response = jsonify({"message": "Estructura obtenida correctamente", "structure": structure})
+    response.set_etag(etag)
+    return response, 200
+
+# Función que responde el listado por partes si el cliente lo pide, si no regresa None
+# ?format=ndjson -> un registro por línea conforme se lee de swift
+# ?limit=N&cursor=... -> una página de registros con "next" para pedir la siguiente
+def streamed_listing_response(container, project):
+    if request.args.get('format') == 'ndjson':
+        def generate():
+            seen_folders = set()
+            try:
+                for page in iter_object_pages(container, project):
+                    for record in iter_listing_records(page, seen_folders):
+                        yield json.dumps(record) + "\n"
+            except Exception as e:
+                yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+        return Response(generate(), mimetype='application/x-ndjson')
+
+    if request.args.get('limit'):
+        limit = max(1, min(int(request.args['limit']), DIRECTORY_PAGE_SIZE))
+        page, next_marker = get_object_page_by_path(container, project, "", marker=request.args.get('cursor'), limit=limit)
+        return jsonify({
+            "message": "Estructura obtenida correctamente",
+            "entries": list(iter_listing_records(page)),
+            "next": next_marker
+        }), 200
+    return None
+
 # Ruta para recibir un solo archivo
 #ejemplo de entrada y salida
 #entrada 
@@ -97,7 +249,11 @@ def upload_file():
         else:
             scope = user.openstack_id
 
-        upload_file_openstack(get_user_identifier(user.id), scope, file_project, file_path , save_path, file_name)
+        # El md5 del archivo en memoria se manda como ETag para que swift verifique lo que recibe
+        upload_file_openstack(get_user_identifier(user.id), scope, file_project, file_path , save_path, file_name,
+                              hashlib.md5(file_bytes).hexdigest(), hashlib.sha256(file_bytes).hexdigest())
+        index_remote_object(get_user_identifier(user.id), scope, file_project, file_name if file_path == '' else '/' + file_path + '/' + file_name)
+        listing_cache.invalidate(get_user_identifier(user.id), file_project)
 
 
         # log_api_request(get_jwt_identity(), "Subida de archivo exitosa", file_path, file_name, 200)
@@ -110,6 +266,89 @@ def upload_file():
         log_api_request(get_jwt_identity(), "Error en la subida de archivo", file_path, file_name, 500, error_message=str(e))
         return jsonify({"error": str(e)}), 500
 
+# Ruta para subir uno o varios archivos en binario, sin codificarlos en base64
+# multipart/form-data: los archivos van como partes del formulario y "path" y "project_id" como campos,
+#   werkzeug lee el formulario completo antes de la ruta y guarda las partes grandes en archivos temporales,
+#   despues se envían a swift desde esos archivos sin otra copia
+# application/octet-stream: el cuerpo es el archivo, el nombre va en X-File-Name y "path" y "project_id" en la url,
+#   el cuerpo se envía a swift conforme llega, sin copiarlo a disco; es el modo para archivos grandes
+# salida
+# "message": "Archivos cargados correctamente", "results": [{"file_name", "size"} o {"file_name", "error"}]
+# "error": "No se recibieron archivos"
+# "error": "Tipo de contenido no soportado"
+# "error": "Se requiere Content-Length"
+# "error": str(ve)
+# "error": "Usuario no autenticado"
+@file_bp.route('/upload/stream', methods=['POST'])
+@jwt_required()  # Proteger con JWT
+def upload_files_stream():
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Usuario no autenticado"}), 401
+
+    # Cada archivo se recibe como (nombre, stream, tamaño), werkzeug guarda las partes grandes en archivos temporales
+    if request.mimetype == 'multipart/form-data':
+        params = request.form
+        files = [(storage.filename, storage.stream, get_stream_size(storage.stream)) for _, storage in request.files.items(multi=True)]
+    elif request.mimetype == 'application/octet-stream':
+        # El cuerpo se envía a swift conforme llega, por lo que se necesita su tamaño desde el inicio
+        if request.content_length is None:
+            return jsonify({"error": "Se requiere Content-Length"}), 411
+        params = request.args
+        files = [(request.headers.get('X-File-Name') or request.args.get('filename'), request.stream, request.content_length)]
+    else:
+        return jsonify({"error": "Tipo de contenido no soportado"}), 415
+
+    if not files:
+        return jsonify({"error": "No se recibieron archivos"}), 400
+
+    user_identifier = get_user_identifier(user.id)
+    file_path = params.get('path', '')
+    file_project = params.get('project_id') or user_identifier
+
+    if params.get('project_id'):
+        subject = Subject.query.filter_by(subject_name=params.get('project_id')).first()
+        if not subject:
+            return jsonify({"error": "Materia no encontrada"}), 404
+        scope = subject.swift_scope
+    else:
+        scope = user.openstack_id
+
+    try:
+        secure_path(get_user_directory(user_identifier), file_path)
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 403
+
+    results = []
+    for file_name, stream, size in files:
+        result = {"file_name": file_name}
+        try:
+            # Solo se usa el nombre del archivo, la carpeta destino la define "path"
+            file_name = os.path.basename((file_name or '').replace("\\", "/"))
+            if not file_name:
+                raise ValueError("Nombre de archivo inválido")
+            if size > MAX_FILE_SIZE:
+                raise ValueError("El archivo es demasiado grande")
+
+            upload_stream_openstack(user_identifier, scope, file_project, file_path, file_name, stream, size)
+            result["size"] = size
+            index_remote_object(user_identifier, scope, file_project, file_name if file_path == '' else '/' + file_path + '/' + file_name)
+        except Exception as e:
+            print(f"Error al subir '{file_name}': {e}")
+            result.pop("size", None)
+            result["error"] = str(e)
+        results.append(result)
+
+    failed = [result for result in results if "error" in result]
+    if len(failed) < len(results):
+        listing_cache.invalidate(user_identifier, file_project)
+    if failed:
+        log_api_request(get_jwt_identity(), "Subida parcial de archivos", file_path, ", ".join(result["file_name"] or '' for result in failed)[:255], 207, error_message=json.dumps(failed))
+        return jsonify({"message": "Algunos archivos no se cargaron", "results": results}), 207
+
+    log_api_request(get_jwt_identity(), "Subida de archivos exitosa", file_path, ", ".join(result["file_name"] for result in results)[:255], 200)
+    return jsonify({"message": "Archivos cargados correctamente", "results": results}), 200
+
 # Ruta para recibir archivos en partes (chunks)
 @file_bp.route('/upload/chunk', methods=['POST'])
 @jwt_required()  # Proteger con JWT
@@ -140,12 +379,43 @@ def upload_file_chunk():
         # Leer el chunk recibido
         chunk = request.data  # El chunk debería enviarse en binario
 
-        # Guardar el chunk en el archivo temporal
-        with open(temp_file_path, 'ab') as temp_file:
-            temp_file.write(chunk)
+        # Verificar el chunk si el cliente manda su sha256 o su md5
+        if request.headers.get('X-Chunk-SHA256') and not verify_chunk_integrity(chunk, request.headers['X-Chunk-SHA256']):
+            return jsonify({"error": f"El sha256 del chunk {chunk_index} no coincide"}), 400
+        if request.headers.get('Content-MD5') and hashlib.md5(chunk).hexdigest() != content_md5_to_etag(request.headers['Content-MD5']):
+            return jsonify({"error": f"El md5 del chunk {chunk_index} no coincide"}), 400
+
+        # Guardar el chunk en el archivo temporal, los chunks se agregan en el orden en que llegan
+        # el hash de todo el archivo solo se calcula si los chunks llegan en orden empezando con el archivo vacío,
+        # un chunk repetido o fuera de orden se agrega igual pero el archivo ya no se verifica completo
+        with chunk_hashes_lock:
+            if chunk_index == 0:
+                chunk_hashes.pop(temp_file_path, None)
+                if not os.path.exists(temp_file_path):
+                    chunk_hashes[temp_file_path] = {"next": 0, "md5": hashlib.md5(), "sha256": hashlib.sha256()}
+            state = chunk_hashes.get(temp_file_path)
+            if state and state["next"] != chunk_index:
+                chunk_hashes.pop(temp_file_path, None)
+                state = None
+
+            with open(temp_file_path, 'ab') as temp_file:
+                temp_file.write(chunk)
+            if state:
+                state["md5"].update(chunk)
+                state["sha256"].update(chunk)
+                state["next"] = chunk_index + 1
 
         # Verificar si es el último chunk
         if chunk_index == total_chunks - 1:
+            # Hashes de todo el archivo, solo si todos los chunks llegaron en orden a este proceso
+            with chunk_hashes_lock:
+                state = chunk_hashes.pop(temp_file_path, None)
+            file_md5 = state["md5"].hexdigest() if state else None
+            file_sha256 = state["sha256"].hexdigest() if state else None
+            if request.headers.get('X-File-SHA256') and file_sha256 and request.headers['X-File-SHA256'].strip().lower() != file_sha256:
+                os.remove(temp_file_path)
+                return jsonify({"error": "El sha256 del archivo no coincide", "sha256": file_sha256}), 422
+
             # Generar la ruta final del archivo, evitando sobrescribir si ya existe
             final_file_path = get_unique_file_path(save_directory, file_name)
             
@@ -158,18 +428,249 @@ def upload_file_chunk():
             else:
                 scope = user.openstack_id
 
-            upload_file_openstack(get_user_identifier(user.id), scope, file_project, file_path , save_directory, file_name)
+            # Se sube el archivo ya armado con el nombre que se le asignó en disco
+            file_name = os.path.basename(final_file_path)
+            upload_file_openstack(get_user_identifier(user.id), scope, file_project, file_path , final_file_path, file_name, file_md5, file_sha256)
+            index_remote_object(get_user_identifier(user.id), scope, file_project, file_name if file_path == '' else '/' + file_path + '/' + file_name)
+            listing_cache.invalidate(get_user_identifier(user.id), file_project)
 
             log_api_request(get_jwt_identity(), "Subida de archivo exitosa", file_path, file_name, 200)
-            return jsonify({"message": "Archivo completo", "file_name": os.path.basename(final_file_path)}), 200
+            return jsonify({"message": "Archivo completo", "file_name": os.path.basename(final_file_path), "sha256": file_sha256}), 200
 
         return jsonify({"message": f"Chunk {chunk_index + 1} de {total_chunks} recibido"}), 200
 
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
     except OSError as e:
         return jsonify({"error": f"Error de sistema: {str(e)}"}), 500
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Ruta para subir un archivo indicando solo su contenido (tamaño y sha256 o md5)
+# si el contenedor del usuario ya tiene un objeto igual se copia en openstack sin transferir los bytes
+# si no, se responde 404 y el cliente sube el archivo por cualquiera de las otras rutas
+#ejemplo de entrada y salida
+# entrada
+# {
+# 	"file_name": "nombre del archivo",
+# 	"size": "tamaño en bytes",
+# 	"sha256": "sha256 del archivo (opcional si se manda md5)",
+# 	"md5": "md5 del archivo (opcional si se manda sha256)",
+# 	"path": "ruta destino (opcional)",
+# 	"project_id": "id del proyecto (opcional)"
+# }
+# salida
+# "message": "Archivo copiado de un objeto existente", "deduplicated": true
+# "message": "No existe un objeto con el mismo contenido", "deduplicated": false
+# "error": "Datos incompletos"
+@file_bp.route('/upload/dedup', methods=['POST'])
+@jwt_required()  # Proteger con JWT
+def upload_file_dedup():
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Usuario no autenticado"}), 401
+
+    data = request.get_json() or {}
+    file_name = os.path.basename((data.get('file_name') or '').replace("\\", "/"))
+    if not file_name or data.get('size') is None or not (data.get('sha256') or data.get('md5')):
+        return jsonify({"error": "Datos incompletos"}), 400
+
+    user_identifier = get_user_identifier(user.id)
+    file_path = data.get('path', '')
+    file_project = data.get('project_id') or user_identifier
+
+    if data.get('project_id'):
+        subject = Subject.query.filter_by(subject_name=data.get('project_id')).first()
+        if not subject:
+            return jsonify({"error": "Materia no encontrada"}), 404
+        scope = subject.swift_scope
+    else:
+        scope = user.openstack_id
+
+    try:
+        secure_path(get_user_directory(user_identifier), file_path)
+        deduplicated = deduplicate_upload(user_identifier, scope, file_project, file_path, file_name, int(data['size']),
+                                          (data.get('sha256') or '').strip().lower() or None, (data.get('md5') or '').strip().lower() or None)
+        if not deduplicated:
+            return jsonify({"message": "No existe un objeto con el mismo contenido", "deduplicated": False}), 404
+
+        log_api_request(get_jwt_identity(), "Subida de archivo exitosa", file_path, file_name, 200)
+        return jsonify({"message": "Archivo copiado de un objeto existente", "deduplicated": True}), 200
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+    except Exception as e:
+        log_api_request(get_jwt_identity(), "Error en la subida de archivo", file_path, file_name, 500, error_message=str(e))
+        return jsonify({"error": str(e)}), 500
+
+# Rutas de subida por sesiones reanudables
+# 1. POST /upload/session crea la sesión y regresa su id
+# 2. PUT /upload/session/<id>/chunk envía cada parte (en paralelo y en cualquier orden) con X-Chunk-Index y X-Chunk-Offset
+#    cada parte se reenvía a swift como segmento sin pasar por el disco
+# 3. GET /upload/session/<id> indica las partes que faltan para reanudar despues de un corte
+# 4. POST /upload/session/<id>/finalize confirma el archivo en openstack con un manifiesto SLO
+#ejemplo de entrada y salida
+# entrada
+# {
+# 	"file_name": "nombre del archivo",
+# 	"file_size": "tamaño total en bytes",
+# 	"chunk_size": "tamaño de cada parte en bytes (opcional)",
+# 	"path": "ruta destino (opcional)",
+# 	"project_id": "id del proyecto (opcional)",
+# 	"sha256": "sha256 del archivo (opcional, si ya existe un objeto igual no se crea la sesión)"
+# }
+# salida
+# "session_id", "chunk_size", "total_chunks"
+# "message": "Archivo copiado de un objeto existente", "deduplicated": true
+# "error": "Datos incompletos"
+# "error": str(ve)
+@file_bp.route('/upload/session', methods=['POST'])
+@jwt_required()  # Proteger con JWT
+def create_upload():
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Usuario no autenticado"}), 401
+
+    data = request.get_json() or {}
+    file_name = os.path.basename((data.get('file_name') or '').replace("\\", "/"))
+    if not file_name or data.get('file_size') is None:
+        return jsonify({"error": "Datos incompletos"}), 400
+
+    user_identifier = get_user_identifier(user.id)
+    file_path = data.get('path', '')
+    file_project = data.get('project_id') or user_identifier
+
+    if data.get('project_id'):
+        subject = Subject.query.filter_by(subject_name=data.get('project_id')).first()
+        if not subject:
+            return jsonify({"error": "Materia no encontrada"}), 404
+        scope = subject.swift_scope
+    else:
+        scope = user.openstack_id
+
+    try:
+        # La ruta destino se valida desde que se crea la sesión
+        secure_path(get_user_directory(user_identifier), file_path)
+        chunk_size = int(data.get('chunk_size', UPLOAD_CHUNK_SIZE))
+        if chunk_size > MAX_FILE_SIZE:
+            raise ValueError("El tamaño de parte es demasiado grande")
+
+        # Con el sha256 del archivo se intenta copiar un objeto igual antes de pedir las partes
+        if data.get('sha256'):
+            if deduplicate_upload(user_identifier, scope, file_project, file_path, file_name, int(data['file_size']), data['sha256'].strip().lower()):
+                log_api_request(get_jwt_identity(), "Subida de archivo exitosa", file_path, file_name, 200)
+                return jsonify({"message": "Archivo copiado de un objeto existente", "deduplicated": True}), 200
+
+        purge_expired_sessions()
+        session = create_upload_session(user.id, file_project, user_identifier, scope, file_path, file_name, int(data['file_size']), chunk_size)
+        return jsonify({
+            "message": "Sesión de subida creada",
+            "session_id": session.id,
+            "chunk_size": session.chunk_size,
+            "total_chunks": session.total_chunks
+        }), 201
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Ruta para recibir una parte de una sesión, el cuerpo es la parte en binario
+# una parte repetida se vuelve a escribir en la misma posición
+@file_bp.route('/upload/session/<session_id>/chunk', methods=['PUT'])
+@jwt_required()  # Proteger con JWT
+def upload_session_chunk(session_id):
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Usuario no autenticado"}), 401
+
+    session = get_upload_session(session_id, user.id)
+    if not session:
+        return jsonify({"error": "Sesión de subida no encontrada"}), 404
+
+    chunk_index = request.headers.get('X-Chunk-Index')
+    offset = request.headers.get('X-Chunk-Offset')
+    if chunk_index is None or offset is None or request.content_length is None:
+        return jsonify({"error": "Faltan cabeceras"}), 400
+
+    try:
+        # X-Chunk-SHA256 y Content-MD5 son opcionales, se verifican mientras la parte se envía a swift
+        sha256 = write_chunk(session, int(chunk_index), int(offset), request.stream, request.content_length,
+                             request.headers.get('X-Chunk-SHA256'), request.headers.get('Content-MD5'))
+        return jsonify({"message": f"Parte {chunk_index} de {session.total_chunks} recibida", "sha256": sha256}), 200
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 502
+
+# Ruta para consultar las partes recibidas y las que faltan de una sesión
+@file_bp.route('/upload/session/<session_id>', methods=['GET'])
+@jwt_required()  # Proteger con JWT
+def upload_session_status(session_id):
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Usuario no autenticado"}), 401
+
+    session = get_upload_session(session_id, user.id)
+    if not session:
+        return jsonify({"error": "Sesión de subida no encontrada"}), 404
+    return jsonify(get_session_status(session)), 200
+
+# Ruta para cancelar una sesión y descartar lo recibido
+@file_bp.route('/upload/session/<session_id>', methods=['DELETE'])
+@jwt_required()  # Proteger con JWT
+def cancel_upload_session(session_id):
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Usuario no autenticado"}), 401
+
+    session = get_upload_session(session_id, user.id)
+    if not session:
+        return jsonify({"error": "Sesión de subida no encontrada"}), 404
+    close_upload_session(session, 'cancelada')
+    return jsonify({"message": "Sesión de subida cancelada"}), 200
+
+# Ruta para terminar una sesión: con todas las partes recibidas se confirma el manifiesto en openstack
+# entrada (opcional)
+# {
+# 	"sha256": "sha256 de todo el archivo"
+# }
+# salida
+# "message": "Archivo completo", "file_name", "sha256" (null si las partes no llegaron en orden)
+# "error": "Faltan partes por recibir", "missing_chunks": [...]
+# "error": "El sha256 del archivo no coincide"
+@file_bp.route('/upload/session/<session_id>/finalize', methods=['POST'])
+@jwt_required()  # Proteger con JWT
+def finalize_upload_session(session_id):
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Usuario no autenticado"}), 401
+
+    session = get_upload_session(session_id, user.id)
+    if not session:
+        return jsonify({"error": "Sesión de subida no encontrada"}), 404
+
+    missing = get_missing_chunks(session)
+    if missing:
+        return jsonify({"error": "Faltan partes por recibir", "missing_chunks": missing}), 409
+
+    # El sha256 de todo el archivo se acumuló mientras llegaban las partes, no se vuelve a leer
+    data = request.get_json(silent=True) or {}
+    file_sha256 = get_file_sha256(session)
+    if data.get('sha256') and file_sha256 and data['sha256'].strip().lower() != file_sha256:
+        return jsonify({"error": "El sha256 del archivo no coincide", "sha256": file_sha256}), 422
+
+    try:
+        # Si el manifiesto falla la sesión sigue abierta para reintentar
+        object_name = finalize_session_object(session)
+        index_remote_object(session.container, session.user_scope, session.account, object_name)
+        listing_cache.invalidate(session.container, session.account)
+        close_upload_session(session, 'finalizada')
+
+        log_api_request(get_jwt_identity(), "Subida de archivo exitosa", session.file_path, session.file_name, 200)
+        return jsonify({"message": "Archivo completo", "file_name": session.file_name, "sha256": file_sha256}), 200
+    except Exception as e:
+        log_api_request(get_jwt_identity(), "Error en la subida de archivo", session.file_path, session.file_name, 500, error_message=str(e))
+        return jsonify({"error": str(e)}), 500
+
 # Ruta para descargar un archivo
 #ejemplo de entrada y salida
 # entrada
@@ -216,20 +717,9 @@ def download_file():
         full_file_path = secure_path(user_directory, '/'+file_path)
         print("full_file_path: ", full_file_path)
         
-        #mandar a descargar el archivo desde openstack
-        if project_id == get_user_identifier(user.id):
-            print("no project_id")
-            download_file_openstack(get_user_identifier(user.id), scope, get_user_identifier(user.id), file_path, file_path, user_directory)
-        else:
-            print("si project_id")
-            download_file_openstack(get_user_identifier(user.id), scope, project_id, file_path, file_path, user_directory)
-        
-        print("full_file_path en funcion: ", full_file_path)
-        if not os.path.exists(full_file_path):
-            return jsonify({"error": "El archivo no existe"}), 404
-
-        # Enviar el archivo al cliente
-        return send_file(full_file_path, as_attachment=True)
+        #pedir el archivo a openstack y reenviarlo al cliente sin guardarlo en disco
+        swift_response = stream_file_openstack(get_user_identifier(user.id), scope, project_id, file_path, get_conditional_headers())
+        return passthrough_response(swift_response, file_path)
 
     except ValueError as ve:
         print("error: ", ve)
@@ -286,20 +776,9 @@ def download_file_for_student():
         full_file_path = secure_path(user_directory, '/'+file_path)
         print("full_file_path: ", full_file_path)
         
-        #mandar a descargar el archivo desde openstack
-        if project_id == get_user_identifier(user.id):
-            print("no project_id")
-            download_file_openstack(student_container, scope, get_user_identifier(user.id), file_path, file_path, user_directory)
-        else:
-            print("si project_id")
-            download_file_openstack(student_container, scope, project_id, file_path, file_path, user_directory)
-        
-        print("full_file_path en funcion: ", full_file_path)
-        if not os.path.exists(full_file_path):
-            return jsonify({"error": "El archivo no existe"}), 404
-
-        # Enviar el archivo al cliente
-        return send_file(full_file_path, as_attachment=True)
+        #pedir el archivo a openstack y reenviarlo al cliente sin guardarlo en disco
+        swift_response = stream_file_openstack(student_container, scope, project_id, file_path, get_conditional_headers())
+        return passthrough_response(swift_response, file_path)
 
     except ValueError as ve:
         print("error: ", ve)
@@ -358,10 +837,20 @@ def delete_file_or_folder():
         #si el target_path es un archivo si tiene extension
         if target_path.find(".") != -1:
             print("es un archivo")
-            delete(user_identifier, scope, project_id, target_path, target_path)
+            # Los segmentos de un SLO se conservan si el manifiesto de otra copia los usa
+            keep_segments = bool(get_shared_segment_names(user_identifier, scope, project_id, [target_path]))
+            delete(user_identifier, scope, project_id, target_path, target_path, keep_segments)
+            remove_indexed_objects(project_id, user_identifier, [target_path])
+            listing_cache.invalidate(user_identifier, project_id)
         else:
             print("es una carpeta")
-            delete_path_openstack(user_identifier, scope, project_id, target_path)
+            result = delete_path_openstack(user_identifier, scope, project_id, target_path,
+                                           lambda names: get_shared_segment_names(user_identifier, scope, project_id, names))
+            remove_indexed_objects(project_id, user_identifier, result["deleted"])
+            listing_cache.invalidate(user_identifier, project_id)
+            if result["errors"]:
+                log_api_request(get_jwt_identity(), "Eliminación parcial", "delete", target_path, 207, error_message=json.dumps(result["errors"]))
+                return jsonify({"message": f"'{target_path}' eliminado parcialmente", "result": result}), 207
         
 
         log_api_request(get_jwt_identity(), "Eliminación exitosa", "delete", target_path, 200)
@@ -387,11 +876,10 @@ def list_files_and_folders():
     # print("user_identifier: ", user_identifier)
     try:
         # Obtener la estructura de archivos y carpetas
-        object_list = get_object_list(user_identifier, user_identifier)
-        object_list = object_list['data']
-        object_list = transform_to_structure(object_list)
-        # print(object_list)
-        return jsonify({"message": "Estructura obtenida correctamente", "structure": object_list}), 200
+        streamed = streamed_listing_response(user_identifier, user_identifier)
+        if streamed is not None:
+            return streamed
+        return structure_response(user_identifier, user_identifier, user.openstack_id)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -419,14 +907,10 @@ def list_files_and_folders_single():
     # print("user_directory: ")
 
     try:
-        object_list = get_object_list(user, group)
-        #print(object_list)
-        object_list = object_list['data']
-        object_list = transform_to_structure(object_list)
-        #imprimir la estructura como json
-        #json.dumps(object_list)
-        # print(json.dumps(object_list))
-        return jsonify({"message": "Estructura obtenida correctamente", "structure": object_list}), 200
+        streamed = streamed_listing_response(user, group)
+        if streamed is not None:
+            return streamed
+        return structure_response(user, group, get_listing_scope(group))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -458,14 +942,181 @@ def list_files_and_folders_by_subject():
     # print("user_directory: ")
 
     try:
-        object_list = get_object_list(user, group)
-        #print(object_list)
-        object_list = object_list['data']
-        object_list = transform_to_structure(object_list)
-        #imprimir la estructura como json
-        #json.dumps(object_list)
-        # print(json.dumps(object_list))
-        return jsonify({"message": "Estructura obtenida correctamente", "structure": object_list}), 200
+        streamed = streamed_listing_response(user, group)
+        if streamed is not None:
+            return streamed
+        return structure_response(user, group, get_listing_scope(group))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Ruta para obtener el resumen de los contenedores de todos los alumnos inscritos en una materia
+#ejemplo de entrada y salida
+# entrada
+# {
+# 	"project_id": "nombre de la materia"
+# }
+# salida
+# "students": [{"student_id", "username", "objects", "bytes", "last_modified"}]
+# "error": "Materia no encontrada"
+# "error": "Acceso denegado"
+@file_bp.route('/list-subject-students', methods=['POST'])
+@jwt_required()  # Protegido con JWT
+def list_subject_students():
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Usuario no autenticado"}), 401
+
+    data = request.get_json() or {}
+    project = data.get('project_id')
+    subject = Subject.query.filter_by(subject_name=project).first()
+    if not subject:
+        return jsonify({"error": "Materia no encontrada"}), 404
+    # Solo el administrador, la academia y el profesor de la materia pueden ver los contenedores de los alumnos
+    if not can_view_subject_students(user, subject):
+        return jsonify({"error": "Acceso denegado"}), 403
+
+    # Los datos de la base se leen antes de listar porque los hilos no tienen contexto de la aplicacion
+    scope = subject.swift_scope
+    students = []
+    for enrollment in Enrollment.query.filter_by(subject_id=subject.subject_id).all():
+        student = Student.query.filter_by(user_id=enrollment.user_id).first()
+        if student:
+            students.append({"student_id": student.boleta, "username": student.user.username})
+
+    def summarize(student):
+        try:
+            student.update(summarize_container(str(student["student_id"]), scope, project))
+        except Exception as e:
+            student["error"] = str(e)
+        return student
+
+    # Listar los contenedores de los alumnos en paralelo
+    with ThreadPoolExecutor(max_workers=SUBJECT_LISTING_WORKERS) as executor:
+        students = list(executor.map(summarize, students))
+
+    return jsonify({"message": "Resumen obtenido correctamente", "students": students}), 200
+
+# Ruta para buscar archivos por nombre, extensión, tamaño y fecha sobre el listado en cache
+#ejemplo de entrada y salida
+# entrada
+# {
+# 	"project_id": "id del proyecto (opcional)",
+# 	"student_id": "contenedor del alumno a consultar (opcional)",
+# 	"all_students": "true para buscar en todos los alumnos inscritos en la materia (opcional)",
+# 	"name": "texto o patron glob del nombre (opcional)",
+# 	"extension": "pdf (opcional)",
+# 	"min_size": "bytes (opcional)", "max_size": "bytes (opcional)",
+# 	"modified_after": "2024-11-25T18:30:00 (opcional)", "modified_before": "... (opcional)",
+# 	"page": 1, "page_size": 100
+# }
+# salida
+# "results": [{"container", "date", "path", "size", "last_modified"}], "total", "page", "next_page"
+# "error": "Acceso denegado"
+# "error": str(e)
+@file_bp.route('/search', methods=['POST'])
+@jwt_required()  # Protegido con JWT
+def search_files():
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Usuario no autenticado"}), 401
+
+    data = request.get_json() or {}
+    user_identifier = get_user_identifier(user.id)
+    project = data.get('project_id') or user_identifier
+
+    try:
+        page = max(1, int(data.get('page', 1)))
+        page_size = max(1, min(int(data.get('page_size', SEARCH_PAGE_SIZE)), SEARCH_MAX_PAGE_SIZE))
+        filters = {
+            "name": data.get('name'),
+            "extension": data.get('extension'),
+            "min_size": int(data['min_size']) if data.get('min_size') is not None else None,
+            "max_size": int(data['max_size']) if data.get('max_size') is not None else None,
+            "modified_after": data.get('modified_after'),
+            "modified_before": data.get('modified_before'),
+        }
+
+        # Contenedores en los que se busca, los de otros alumnos solo si el usuario puede verlos
+        if data.get('all_students'):
+            subject = Subject.query.filter_by(subject_name=project).first()
+            if not subject:
+                return jsonify({"error": "Materia no encontrada"}), 404
+            if not can_view_subject_students(user, subject):
+                return jsonify({"error": "Acceso denegado"}), 403
+            containers = []
+            for enrollment in Enrollment.query.filter_by(subject_id=subject.subject_id).all():
+                student = Student.query.filter_by(user_id=enrollment.user_id).first()
+                if student:
+                    containers.append(student.boleta)
+        else:
+            containers = [data.get('student_id') or user_identifier]
+            if not can_view_container(user, user_identifier, containers[0], project):
+                return jsonify({"error": "Acceso denegado"}), 403
+
+        # Los hilos necesitan el contexto de la aplicación para consultar el índice
+        app = current_app._get_current_object()
+        scope = get_listing_scope(project, user)
+
+        def search_container(container):
+            with app.app_context():
+                return [dict(result, container=container)
+                        for result in filter_objects(get_cached_object_list(container, project, scope), **filters)]
+
+        # Los listados de varios contenedores se obtienen en paralelo
+        with ThreadPoolExecutor(max_workers=SUBJECT_LISTING_WORKERS) as executor:
+            results = [result for found in executor.map(search_container, containers) for result in found]
+
+        start = (page - 1) * page_size
+        return jsonify({
+            "message": "Búsqueda realizada correctamente",
+            "results": results[start:start + page_size],
+            "total": len(results),
+            "page": page,
+            "next_page": page + 1 if start + page_size < len(results) else None
+        }), 200
+    except ValueError as ve:
+        return jsonify({"error": f"Filtro inválido: {str(ve)}"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Ruta para listar solo el contenido inmediato de una carpeta
+#ejemplo de entrada y salida
+# entrada
+# {
+# 	"path": "ruta de la carpeta ('' para la raiz)",
+# 	"project_id": "id del proyecto (opcional)",
+# 	"student_id": "contenedor del alumno a consultar (opcional)",
+# 	"marker": "valor de next_marker de la pagina anterior (opcional)",
+# 	"limit": "entradas por pagina (opcional)"
+# }
+# salida
+# "structure": {"folders": [...], "files": [...]}, "next_marker": "..." o null
+# "error": "Acceso denegado"
+# "error": str(e)
+@file_bp.route('/list-dir', methods=['POST'])
+@jwt_required()  # Protegido con JWT
+def list_directory():
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Usuario no autenticado"}), 401
+
+    data = request.get_json() or {}
+    user_identifier = get_user_identifier(user.id)
+    container = data.get('student_id') or user_identifier
+    project = data.get('project_id') or user_identifier
+    path = data.get('path', '')
+    # El directorio de otro alumno solo lo puede ver quien tiene acceso a los alumnos de la materia
+    if not can_view_container(user, user_identifier, container, project):
+        return jsonify({"error": "Acceso denegado"}), 403
+
+    try:
+        limit = max(1, min(int(data.get('limit', DIRECTORY_PAGE_SIZE)), DIRECTORY_PAGE_SIZE))
+        entries, next_marker = get_directory_children(container, project, path, data.get('marker'), limit)
+        return jsonify({
+            "message": "Estructura obtenida correctamente",
+            "structure": transform_to_directory_node(entries),
+            "next_marker": next_marker
+        }), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -509,6 +1160,10 @@ def create_folder():
             scope = user.openstack_id
 
         create_path(get_user_identifier(user.id), scope , project, parent_dir, folder_name)
+        # Mismo nombre con el que create_path guarda el marcador de la carpeta
+        folder_object = (parent_dir if parent_dir != '/' else '') + '/' + folder_name + '/'
+        index_remote_object(get_user_identifier(user.id), scope, project, folder_object)
+        listing_cache.invalidate(get_user_identifier(user.id), project)
         return jsonify({"message": f"Carpeta '{folder_name}' creada exitosamente"}), 200
 
     except ValueError as ve:
@@ -557,12 +1212,8 @@ def download_folder():
     
     project = data.get('project_id', get_user_identifier(user.id))
     print("Proyecto identificado:", project)  # Depuración de project_id
-
-    full_folder_path = os.path.join(store_path + str(get_user_identifier(user.id)))
-    print("Ruta completa de la carpeta del usuario:", full_folder_path)  # Depuración de ruta completa
     
     try:
-        print("Iniciando descarga desde OpenStack...")  # Depuración del inicio de descarga
         if data.get('project_id') is not None:
             project_id = data.get('project_id')
             scope = Subject.query.filter_by(subject_name=project_id).first()
@@ -570,60 +1221,20 @@ def download_folder():
         else:
             scope = user.openstack_id
 
-        download_path_openstack(get_user_identifier(user.id), scope, project, folder_path, full_folder_path)
-        
-        zip_dir = zip_path
-        print("Directorio para ZIP definido:", zip_dir)  # Depuración de directorio ZIP
-
-        if not os.path.exists(zip_dir):
-            print("El directorio ZIP no existe, creando:", zip_dir)  # Depuración de creación de directorio
-            os.makedirs(zip_dir)
-
-        folder_path = os.path.normpath(folder_path)
-        full_file_path = os.path.join(full_folder_path, folder_path.lstrip("/\\"))
-        full_file_path = os.path.normpath(full_file_path)
-        print("Ruta normalizada de la carpeta a comprimir:", full_file_path)  # Depuración de ruta final
-        
-        if not os.path.exists(full_file_path):
-            print(f"Error: La carpeta no existe en {full_file_path}")  # Depuración de existencia
+        # La carpeta se lista con "/" al final para no incluir carpetas que empiezan con el mismo nombre
+        folder_prefix = folder_path.rstrip('/') + '/'
+        objects = get_object_list_by_path(get_user_identifier(user.id), project, folder_prefix)
+        if not objects or not isinstance(objects, list):
+            print(f"Error: La carpeta no existe: {folder_path}")  # Depuración de existencia
             return jsonify({"error": "La carpeta no existe"}), 404
 
-        zip_filename = f"{os.path.basename(full_folder_path)}_{uuid.uuid4().hex}.zip"
-        zip_filepath = os.path.join(zip_dir, zip_filename)
-        print("Ruta del archivo ZIP a generar:", zip_filepath)  # Depuración de nombre ZIP
-
-        with zipfile.ZipFile(zip_filepath, 'w', zipfile.ZIP_DEFLATED) as zf:
-            processed_files = 0
-            total_files = 0
-
-            # Usar os.walk para recorrer recursivamente
-            for root, dirs, files in os.walk(full_file_path):
-                for file in files:
-                    total_files += 1
-
-            print(f"Archivos totales a comprimir: {total_files}")  # Depuración del conteo de archivos
-
-            # Agregar archivos al ZIP
-            for root, dirs, files in os.walk(full_file_path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, full_folder_path)  # Ruta relativa dentro del ZIP
-                    print(f"Agregando archivo al ZIP: {file_path} como {arcname}")  # Depuración del archivo agregado
-                    zf.write(file_path, arcname)
-
-                    # Actualizar progreso
-                    processed_files += 1
-                    progress = (processed_files / total_files) * 100
-                    print(f"Progreso de compresión: {progress:.2f}% ({processed_files}/{total_files})")
+        zip_filename = f"{get_user_identifier(user.id)}_{uuid.uuid4().hex}.zip"
+        print("Enviando ZIP al cliente mientras se genera:", zip_filename)  # Depuración de envío
 
-        @after_this_request
-        def schedule_file_deletion(response):
-            print(f"Programando eliminación del archivo ZIP: {zip_filepath}")  # Depuración de eliminación
-            threading.Thread(target=delayed_file_deletion, args=(zip_filepath, 60)).start()
-            return response
-
-        print("Enviando archivo ZIP al cliente...")  # Depuración de envío
-        return send_file(zip_filepath, as_attachment=True, download_name=os.path.basename(zip_filepath))
+        # El zip se comprime y se envia conforme llegan los objetos desde swift, sin archivos temporales
+        zip_stream = stream_path_zip_openstack(get_user_identifier(user.id), scope, project, objects, folder_prefix)
+        return Response(zip_stream, mimetype='application/zip', direct_passthrough=True,
+                        headers={'Content-Disposition': f'attachment; filename="{zip_filename}"'})
 
     except Exception as e:
         print(f"Error al procesar la carpeta: {str(e)}")  # Depuración de errores
@@ -668,15 +1279,11 @@ def download_folder_student():
     
     project = data.get('project_id', get_user_identifier(user.id))
     print("Proyecto identificado:", project)  # Depuración de project_id
-
-    full_folder_path = os.path.join(store_path + str(get_user_identifier(user.id)))
-    print("Ruta completa de la carpeta del usuario:", full_folder_path)  # Depuración de ruta completa
     
     try:
         student_container = data.get('student_id')
         print("student_container: ", student_container)
 
-        print("Iniciando descarga desde OpenStack...")  # Depuración del inicio de descarga
         if data.get('project_id') is not None:
             project_id = data.get('project_id')
             scope = Subject.query.filter_by(subject_name=project_id).first()
@@ -684,60 +1291,20 @@ def download_folder_student():
         else:
             scope = user.openstack_id
 
-        download_path_openstack(student_container, scope, project, folder_path, full_folder_path)
-        
-        zip_dir = zip_path
-        print("Directorio para ZIP definido:", zip_dir)  # Depuración de directorio ZIP
-
-        if not os.path.exists(zip_dir):
-            print("El directorio ZIP no existe, creando:", zip_dir)  # Depuración de creación de directorio
-            os.makedirs(zip_dir)
-
-        folder_path = os.path.normpath(folder_path)
-        full_file_path = os.path.join(full_folder_path, folder_path.lstrip("/\\"))
-        full_file_path = os.path.normpath(full_file_path)
-        print("Ruta normalizada de la carpeta a comprimir:", full_file_path)  # Depuración de ruta final
-        
-        if not os.path.exists(full_file_path):
-            print(f"Error: La carpeta no existe en {full_file_path}")  # Depuración de existencia
+        # La carpeta se lista con "/" al final para no incluir carpetas que empiezan con el mismo nombre
+        folder_prefix = folder_path.rstrip('/') + '/'
+        objects = get_object_list_by_path(student_container, project, folder_prefix)
+        if not objects or not isinstance(objects, list):
+            print(f"Error: La carpeta no existe: {folder_path}")  # Depuración de existencia
             return jsonify({"error": "La carpeta no existe"}), 404
 
-        zip_filename = f"{os.path.basename(full_folder_path)}_{uuid.uuid4().hex}.zip"
-        zip_filepath = os.path.join(zip_dir, zip_filename)
-        print("Ruta del archivo ZIP a generar:", zip_filepath)  # Depuración de nombre ZIP
+        zip_filename = f"{get_user_identifier(user.id)}_{uuid.uuid4().hex}.zip"
+        print("Enviando ZIP al cliente mientras se genera:", zip_filename)  # Depuración de envío
 
-        with zipfile.ZipFile(zip_filepath, 'w', zipfile.ZIP_DEFLATED) as zf:
-            processed_files = 0
-            total_files = 0
-
-            # Usar os.walk para recorrer recursivamente
-            for root, dirs, files in os.walk(full_file_path):
-                for file in files:
-                    total_files += 1
-
-            print(f"Archivos totales a comprimir: {total_files}")  # Depuración del conteo de archivos
-
-            # Agregar archivos al ZIP
-            for root, dirs, files in os.walk(full_file_path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, full_folder_path)  # Ruta relativa dentro del ZIP
-                    print(f"Agregando archivo al ZIP: {file_path} como {arcname}")  # Depuración del archivo agregado
-                    zf.write(file_path, arcname)
-
-                    # Actualizar progreso
-                    processed_files += 1
-                    progress = (processed_files / total_files) * 100
-                    print(f"Progreso de compresión: {progress:.2f}% ({processed_files}/{total_files})")
-
-        @after_this_request
-        def schedule_file_deletion(response):
-            print(f"Programando eliminación del archivo ZIP: {zip_filepath}")  # Depuración de eliminación
-            threading.Thread(target=delayed_file_deletion, args=(zip_filepath, 60)).start()
-            return response
-
-        print("Enviando archivo ZIP al cliente...")  # Depuración de envío
-        return send_file(zip_filepath, as_attachment=True, download_name=os.path.basename(zip_filepath))
+        # El zip se comprime y se envia conforme llegan los objetos desde swift, sin archivos temporales
+        zip_stream = stream_path_zip_openstack(student_container, scope, project, objects, folder_prefix)
+        return Response(zip_stream, mimetype='application/zip', direct_passthrough=True,
+                        headers={'Content-Disposition': f'attachment; filename="{zip_filename}"'})
 
     except Exception as e:
         print(f"Error al procesar la carpeta: {str(e)}")  # Depuración de errores
@@ -796,9 +1363,19 @@ def move_file_or_folder():
         if "." in file_name:
             print("es un archivo el que se mueve")
             move_data(get_user_identifier(user.id), user_scope, project, source_path, file_name, destination_path)
+            move_indexed_objects(project, get_user_identifier(user.id), [source_path], os.path.join(destination_path, file_name).replace("\\", "/"))
+            listing_cache.invalidate(get_user_identifier(user.id), project)
         else:
             print("es un directorio el que se mueve")
-            move_path_to_path(get_user_identifier(user.id), user_scope, project, source_path, destination_path)
+            try:
+                result = move_path_to_path(get_user_identifier(user.id), user_scope, project, source_path, destination_path)
+                move_indexed_objects(project, get_user_identifier(user.id), result["moved"], destination_path, source_path)
+            finally:
+                # Aunque el movimiento falle algunos objetos pudieron haberse copiado
+                listing_cache.invalidate(get_user_identifier(user.id), project)
+            if result["errors"]:
+                log_api_request(get_jwt_identity(), "Movimiento parcial de carpeta", "move", source_path, 207, error_message=json.dumps(result["errors"]))
+                return jsonify({"message": f"'{source_path}' movido parcialmente a '{destination_path}'", "result": result}), 207
             
         return jsonify({"message": f"'{source_path}' movido exitosamente a '{destination_path}'"}), 200
 
@@ -818,7 +1395,13 @@ def get_space():
 
     user_identifier = get_user_identifier(user.id)
     # user_directory = get_user_directory(user_identifier)
-    size = size_container(user_identifier, user.openstack_id, user_identifier)
+    # El tamaño se toma del índice local si el contenedor ya esta cargado
+    size = get_indexed_container_size(user_identifier, user_identifier)
+    if size is not None:
+        #Bytes to MB
+        size = size / 1024 / 1024
+    else:
+        size = size_container(user_identifier, user.openstack_id, user_identifier)
     total_size = user.storage_limit
     #pasar de gb a mb
     total_size = total_size * 1024
@@ -831,4 +1414,16 @@ def get_space():
         "total_space": total_size,
         "used_space": round(used_size,2),
         "free_space": round(free_space,2)
-    }), 200
\ No newline at end of file
+    }), 200
+
+# Ruta para consultar los contadores de la cache de listados
+@file_bp.route('/cache-stats', methods=['GET'])
+@jwt_required()
+def get_cache_stats():
+    return jsonify({"listing_cache": listing_cache.stats()}), 200
+
+# Ruta para consultar el avance y el atraso de la reconciliación del índice con swift
+@file_bp.route('/index-stats', methods=['GET'])
+@jwt_required()
+def get_index_stats():
+    return jsonify({"index_reconciler": index_reconciler.stats()}), 200
@@ -0,0 +1,255 @@
+#índice local de los metadatos de los objetos de swift
+#se actualiza en cada escritura para responder listados, tamaños y búsquedas con la base de datos en lugar de swift
+#un contenedor solo se consulta en el índice despues de cargar su listado completo una vez (ContainerIndex)
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from sqlalchemy import func
+from ..db.db import db, ContainerIndex, ObjectIndex
+from ..openstack.object import get_move_destination, get_slo_segments, head_object
+
+#tiempo que se confia en el índice de un contenedor antes de volver a cargar su listado desde swift
+#corrige lo que el índice no ve: escrituras fuera de la API, errores al actualizarlo y borrados incompletos
+INDEX_MAX_AGE = timedelta(minutes=30)
+
+#las llaves se guardan como texto porque el identificador puede llegar como numero
+def index_key(account, container):
+    return str(account), str(container)
+
+#los nombres se guardan sin la barra inicial con la que swift guarda algunos objetos
+def normalize_name(name):
+    return name.replace("\\", "/").lstrip("/")
+
+#fecha actual en UTC sin zona horaria, igual que las fechas que regresa swift
+def utc_now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+#convertir la fecha del listado (ISO) o de un HEAD (formato HTTP) a datetime
+def parse_last_modified(value):
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        try:
+            return parsedate_to_datetime(value).replace(tzinfo=None)
+        except (TypeError, ValueError):
+            return None
+
+#saber si el listado completo del contenedor ya se cargó en el índice
+def is_container_indexed(account, container):
+    account, container = index_key(account, container)
+    return ContainerIndex.query.filter_by(account=account, container=container).first() is not None
+
+#cargar el listado completo de un contenedor (formato de "openstack object list --long") reemplazando lo que hubiera
+def index_listing(account, container, object_list):
+    account, container = index_key(account, container)
+    try:
+        ObjectIndex.query.filter_by(account=account, container=container).delete()
+        rows = {}
+        for item in object_list:
+            name = normalize_name(item.get("Name", ""))
+            if not name:
+                continue
+            rows[name] = {
+                "account": account,
+                "container": container,
+                "name": name,
+                "size": item.get("Bytes", 0),
+                "etag": item.get("Hash"),
+                "content_type": item.get("Content Type"),
+                "last_modified": parse_last_modified(item.get("Last Modified")),
+            }
+        db.session.bulk_insert_mappings(ObjectIndex, list(rows.values()))
+
+        marker = ContainerIndex.query.filter_by(account=account, container=container).first()
+        if marker:
+            marker.indexed_at = utc_now()
+        else:
+            db.session.add(ContainerIndex(account=account, container=container, indexed_at=utc_now()))
+        db.session.commit()
+        print(f"Índice de '{account}/{container}' cargado con {len(rows)} objetos")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error al cargar el índice de '{account}/{container}': {e}")
+
+#saber si el índice del contenedor se puede usar en lugar de swift
+#headers son las cabeceras del HEAD del contenedor, si el numero de objetos o los bytes no coinciden con el índice hay que recargarlo
+def is_index_current(account, container, headers=None):
+    account, container = index_key(account, container)
+    marker = ContainerIndex.query.filter_by(account=account, container=container).first()
+    if not marker or not marker.indexed_at or utc_now() - marker.indexed_at > INDEX_MAX_AGE:
+        return False
+    if headers is None:
+        return True
+    count, size = db.session.query(func.count(ObjectIndex.id), func.sum(ObjectIndex.size)).filter_by(account=account, container=container).one()
+    if headers.get('X-Container-Object-Count') not in [None, str(count)]:
+        print(f"Índice de '{account}/{container}' desactualizado: {count} objetos, swift tiene {headers.get('X-Container-Object-Count')}")
+        return False
+    if headers.get('X-Container-Bytes-Used') not in [None, str(int(size or 0))]:
+        print(f"Índice de '{account}/{container}' desactualizado: {int(size or 0)} bytes, swift tiene {headers.get('X-Container-Bytes-Used')}")
+        return False
+    return True
+
+#obtener el listado de un contenedor desde el índice con el mismo formato que el de swift
+#regresa None si el contenedor no esta en el índice o ya no corresponde a swift y hay que cargarlo de nuevo
+def get_indexed_object_list(account, container, headers=None):
+    if not is_index_current(account, container, headers):
+        return None
+    account, container = index_key(account, container)
+    rows = ObjectIndex.query.filter_by(account=account, container=container).order_by(ObjectIndex.name).all()
+    return [{
+        "Name": row.name,
+        "Bytes": row.size,
+        "Hash": row.etag,
+        "Content Type": row.content_type,
+        "Last Modified": row.last_modified.isoformat() if row.last_modified else "",
+    } for row in rows]
+
+#tamaño usado por un contenedor segun el índice en bytes, None si no esta en el índice o ya no esta vigente
+def get_indexed_container_size(account, container):
+    if not is_index_current(account, container):
+        return None
+    account, container = index_key(account, container)
+    size = db.session.query(func.sum(ObjectIndex.size)).filter_by(account=account, container=container).scalar()
+    return int(size or 0)
+
+#agregar o actualizar un objeto del índice
+def index_object(account, container, name, size, etag=None, content_type=None, last_modified=None, sha256=None):
+    if not is_container_indexed(account, container):
+        return
+    account, container = index_key(account, container)
+    name = normalize_name(name)
+    try:
+        row = ObjectIndex.query.filter_by(account=account, container=container, name=name).first()
+        if not row:
+            row = ObjectIndex(account=account, container=container, name=name)
+            db.session.add(row)
+        row.size = size
+        row.etag = etag
+        row.sha256 = sha256
+        row.content_type = content_type
+        row.last_modified = parse_last_modified(last_modified) or utc_now()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error al actualizar el índice de '{name}': {e}")
+
+#actualizar un objeto del índice con los metadatos que regresa swift (HEAD) despues de escribirlo
+def index_remote_object(user, user_scope, project, object_name):
+    if not is_container_indexed(project, user):
+        return
+    try:
+        headers = head_object(user, user_scope, project, object_name)
+    except Exception as e:
+        print(f"Error al consultar '{object_name}' para el índice: {e}")
+        return
+    if headers is None:
+        remove_indexed_objects(project, user, [object_name])
+        return
+    index_object(
+        project, user, object_name,
+        int(headers.get('Content-Length', 0)),
+        (headers.get('Etag') or '').strip('"') or None,
+        headers.get('Content-Type'),
+        headers.get('Last-Modified'),
+        headers.get('X-Object-Meta-Sha256'),
+    )
+
+#eliminar objetos del índice
+def remove_indexed_objects(account, container, names):
+    if not names or not is_container_indexed(account, container):
+        return
+    account, container = index_key(account, container)
+    try:
+        ObjectIndex.query.filter(
+            ObjectIndex.account == account,
+            ObjectIndex.container == container,
+            ObjectIndex.name.in_([normalize_name(name) for name in names]),
+        ).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error al eliminar objetos del índice: {e}")
+
+#objetos del contenedor con el mismo contenido (mismo tamaño y mismo sha256 o md5)
+#solo se busca en el contenedor del propio usuario, asi un digest no sirve para obtener archivos de otros
+#el md5 solo sirve para objetos normales, el ETag de un SLO no es el md5 de su contenido
+def find_duplicate_objects(account, container, size, sha256=None, md5=None, limit=5):
+    if not sha256 and not md5:
+        return []
+    account, container = index_key(account, container)
+    query = ObjectIndex.query.filter(ObjectIndex.account == account, ObjectIndex.container == container,
+                                     ObjectIndex.size == size, ~ObjectIndex.name.endswith('/'))
+    if sha256:
+        query = query.filter(ObjectIndex.sha256 == sha256)
+    else:
+        query = query.filter(ObjectIndex.etag == md5)
+    return query.order_by(ObjectIndex.last_modified.desc()).limit(limit).all()
+
+#segmentos de un SLO del contenedor, con y sin la barra inicial con la que se guardan algunos objetos
+def get_object_segments(user, user_scope, project, name):
+    for object_name in [name, '/' + normalize_name(name)]:
+        segments = get_slo_segments(user, user_scope, project, object_name)
+        if segments is None or segments:
+            return segments
+    return set()
+
+#nombres de los SLO cuyos segmentos tambien los usa otro manifiesto del contenedor
+#las copias por contenido (dedup) apuntan a los mismos segmentos que el original, mientras exista otra copia los segmentos se conservan
+#los candidatos son los objetos del índice con el mismo contenido y se confirma leyendo sus manifiestos,
+#un archivo subido aparte con el mismo contenido tiene sus propios segmentos y no los conserva
+#los objetos de names se eliminan juntos y no cuentan como copias; si un manifiesto no se puede leer los segmentos se conservan
+def get_shared_segment_names(user, user_scope, project, names):
+    account, container = index_key(project, user)
+    deleting = [normalize_name(name) for name in names]
+    shared = []
+    for name in names:
+        row = ObjectIndex.query.filter_by(account=account, container=container, name=normalize_name(name)).first()
+        if not row or not (row.sha256 or row.etag):
+            continue
+        match = ObjectIndex.sha256 == row.sha256 if row.sha256 else ObjectIndex.etag == row.etag
+        copies = ObjectIndex.query.filter(
+            ObjectIndex.account == account,
+            ObjectIndex.container == container,
+            ObjectIndex.size == row.size,
+            ~ObjectIndex.name.in_(deleting),
+            match,
+        ).all()
+        if not copies:
+            continue
+
+        segments = get_object_segments(user, user_scope, project, name)
+        if segments is None:
+            shared.append(name)
+            continue
+        for copy in copies:
+            copy_segments = get_object_segments(user, user_scope, project, copy.name)
+            if copy_segments is None or segments & copy_segments:
+                print(f"Los segmentos de '{name}' tambien los usa '{copy.name}', se conservan")
+                shared.append(name)
+                break
+    return shared
+
+#renombrar objetos del índice despues de moverlos
+#con source_path se calcula el destino de cada objeto de la carpeta, sin el se usa new_path como nombre destino
+def move_indexed_objects(account, container, names, new_path, source_path=None):
+    if not names or not is_container_indexed(account, container):
+        return
+    account, container = index_key(account, container)
+    try:
+        for name in names:
+            name = normalize_name(name)
+            destination = normalize_name(get_move_destination(name, source_path, new_path) if source_path else new_path)
+            row = ObjectIndex.query.filter_by(account=account, container=container, name=name).first()
+            if not row or destination == name:
+                continue
+            # La copia reemplaza al objeto que hubiera en el destino
+            ObjectIndex.query.filter_by(account=account, container=container, name=destination).delete()
+            row.name = destination
+            row.last_modified = utc_now()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error al mover objetos en el índice: {e}")
@@ -1,12 +1,14 @@
 
-from datetime import datetime
+import base64
+from datetime import datetime, timezone
+import fnmatch
 import hashlib
 import os
 from pathlib import Path
 import time
 from flask_jwt_extended import get_jwt_identity
 from ..db.path import store_path, zip_path
-from ..db.db import Role, db, User, Student, Teacher, Academy
+from ..db.db import Role, db, User, Student, Teacher, Academy, Enrollment, Subject
 
 
 # Función para generar la ruta de guardado con limpieza de espacios en blanco
@@ -33,10 +35,24 @@ def get_unique_file_path(directory, file_name):
     return new_file_path
 
 # Función para verificar el hash de integridad del chunk
+# chunk_data puede ser el contenido o el hash sha256 que se calculó mientras se recibía
 def verify_chunk_integrity(chunk_data, expected_hash):
-    hash_object = hashlib.sha256()
-    hash_object.update(chunk_data)
-    return hash_object.hexdigest() == expected_hash
+    if hasattr(chunk_data, 'hexdigest'):
+        hash_object = chunk_data
+    else:
+        hash_object = hashlib.sha256()
+        hash_object.update(chunk_data)
+    return hash_object.hexdigest() == expected_hash.strip().lower()
+
+# Función que convierte la cabecera Content-MD5 (base64) al md5 en hexadecimal que usa swift como ETag
+def content_md5_to_etag(content_md5):
+    try:
+        digest = base64.b64decode(content_md5, validate=True)
+    except (ValueError, TypeError):
+        raise ValueError("Content-MD5 inválido")
+    if len(digest) != 16:
+        raise ValueError("Content-MD5 inválido")
+    return digest.hex()
 
 # Función que obtiene la estructura de directorios y archivos recursivamente
 def get_directory_structure(root_dir):
@@ -201,6 +217,34 @@ def get_user_identifier(user_id):
     else:
         return None
 
+# Función para saber si el usuario puede consultar los archivos de los alumnos de una materia
+# el administrador puede ver todas, el profesor las materias que imparte, la academia las suyas y el alumno ninguna
+def can_view_subject_students(user, subject):
+    if not user or not subject:
+        return False
+    if isinstance(user, Academy):
+        return subject.academy_id == user.academy_id
+    role = user.role.name if user.role else None
+    if role == 'Administrador':
+        return True
+    if role == 'Profesor':
+        return subject.teacher_id == user.id
+    if role == 'Academia':
+        academy = Academy.query.filter_by(main_teacher_id=user.id).first()
+        return academy is not None and subject.academy_id == academy.academy_id
+    return False
+
+# Función para saber si el usuario puede consultar un contenedor dentro de un proyecto
+# su propio contenedor siempre, el de un alumno solo si puede ver a los alumnos de la materia y el alumno esta inscrito en ella
+def can_view_container(user, user_identifier, container, project):
+    if str(container) == str(user_identifier):
+        return True
+    subject = Subject.query.filter_by(subject_name=str(project)).first()
+    if not can_view_subject_students(user, subject):
+        return False
+    student = Student.query.filter_by(boleta=container).first()
+    return student is not None and Enrollment.query.filter_by(user_id=student.user_id, subject_id=subject.subject_id).first() is not None
+
 # Función para eliminar un archivo después de un retraso
 def delayed_file_deletion(filepath, delay=180):
     time.sleep(delay)
@@ -210,6 +254,8 @@ def delayed_file_deletion(filepath, delay=180):
     except Exception as e:
         print(f"Error al eliminar el archivo {filepath}: {e}")
 
+#construye la estructura de carpetas y archivos a partir del listado de swift en una sola pasada
+#cada carpeta se enlaza con su padre solo cuando se crea, asi no se buscan carpetas dentro de las listas
 def transform_to_structure(data):
     structure = {}
 
@@ -223,34 +269,32 @@ def transform_to_structure(data):
         is_dir = item["Name"].endswith("/")  # Detectar si es un directorio basado en la barra final
         parts = name.split("/")
 
-        current_path = "/".join(parts)
-        parent_path = "/".join(parts[:-1]) if len(parts) > 1 else ""
-
         # Asegurar que los directorios padres existan en la estructura
-        for i in range(1, len(parts)):  # Comenzamos desde 1 para evitar incluir el nivel raíz
-            folder_path = "/".join(parts[:i])  # Carpeta actual en el camino
+        # La ruta de cada carpeta se arma a partir de la de su padre
+        parent_path = ""
+        for part in parts[:-1]:
+            folder_path = parent_path + "/" + part if parent_path else part
             if folder_path not in structure:
                 structure[folder_path] = {"files": [], "folders": []}
-
-            # Agregar la carpeta actual al directorio padre
-            parent = "/".join(parts[:i-1]) if i > 1 else ""  # Directorio padre
-            if parent and folder_path not in structure[parent]["folders"]:
-                structure[parent]["folders"].append(folder_path)
+                # Agregar la carpeta al directorio padre, las de la raíz se agregan al final
+                if parent_path:
+                    structure[parent_path]["folders"].append(folder_path)
+            parent_path = folder_path
 
         # Si es un directorio, lo agregamos sin archivos
         if is_dir:
-            if current_path not in structure:
-                structure[current_path] = {"files": [], "folders": []}
-            # Asegurarnos de agregar el directorio vacío como una carpeta de su directorio padre
-            if parent_path and current_path not in structure[parent_path]["folders"]:
-                structure[parent_path]["folders"].append(current_path)
+            if name not in structure:
+                structure[name] = {"files": [], "folders": []}
+                # Agregar el directorio vacío como una carpeta de su directorio padre
+                if parent_path:
+                    structure[parent_path]["folders"].append(name)
             continue
         else:
             # Si es un archivo, agregamos la información
             try:
                 file_info = {
                     "date": datetime.fromisoformat(item["Last Modified"]).strftime("%Y/%m/%d"),
-                    "path": current_path,
+                    "path": name,
                     "size": round(item["Bytes"] / 1024, 2)  # Convertir bytes a kilobytes
                 }
                 if parent_path not in structure:
@@ -263,6 +307,113 @@ def transform_to_structure(data):
     root_folders = set(folder.split("/")[0] for folder in structure if "/" in folder or folder)
     if "" not in structure:
         structure[""] = {"files": [], "folders": []}
-    structure[""]["folders"].extend(folder for folder in root_folders if folder not in structure[""]["folders"])
+    root = structure[""]["folders"]
+    existing = set(root)
+    for folder in root_folders:
+        if folder not in existing:
+            root.append(folder)
+            existing.add(folder)
+
+    return structure
+
+#convierte los hijos inmediatos de una carpeta (listado con delimiter) en un nodo
+#con la misma forma que los de transform_to_structure
+def transform_to_directory_node(entries):
+    node = {"files": [], "folders": []}
+    for entry in entries:
+        if "subdir" in entry:
+            node["folders"].append(entry["subdir"].strip("/"))
+            continue
+        try:
+            node["files"].append({
+                "date": datetime.fromisoformat(entry["last_modified"]).strftime("%Y/%m/%d"),
+                "path": entry["name"].strip("/"),
+                "size": round(entry["bytes"] / 1024, 2)  # Convertir bytes a kilobytes
+            })
+        except (KeyError, ValueError):
+            print(f"Objeto con formato inválido: {entry}")
+    return node
+
+#convierte objetos del listado de swift en registros independientes para enviarlos uno por uno
+#cada carpeta se envia una sola vez antes del primer archivo o carpeta que contiene
+#  {"type": "folder", "path": "home/ali", "parent": "home"}
+#  {"type": "file", "parent": "home/ali", "date": "2024/11/25", "path": "home/ali/a.txt", "size": 0.36}
+def iter_listing_records(objects, seen_folders=None):
+    if seen_folders is None:
+        seen_folders = set()
+    for obj in objects:
+        name = obj.get("name", "").strip("/")
+        parts = name.split("/")
+        is_dir = obj.get("name", "").endswith("/")
+
+        # Las carpetas padres (y la misma carpeta si el objeto es un marcador de carpeta)
+        folder_parts = parts if is_dir else parts[:-1]
+        parent_path = ""
+        for part in folder_parts:
+            folder_path = parent_path + "/" + part if parent_path else part
+            if folder_path not in seen_folders:
+                seen_folders.add(folder_path)
+                yield {"type": "folder", "path": folder_path, "parent": parent_path}
+            parent_path = folder_path
+
+        if is_dir or not name:
+            continue
+        try:
+            yield {
+                "type": "file",
+                "parent": parent_path,
+                "date": datetime.fromisoformat(obj["last_modified"]).strftime("%Y/%m/%d"),
+                "path": name,
+                "size": round(obj["bytes"] / 1024, 2)  # Convertir bytes a kilobytes
+            }
+        except (KeyError, ValueError):
+            print(f"Objeto con formato inválido: {obj}")
+
+#convertir una fecha ISO a UTC sin zona horaria, igual que las fechas de swift
+#acepta fechas con "Z" o con diferencia horaria (por ejemplo "2024-11-25T18:30:00-06:00")
+def parse_utc_date(value):
+    date = datetime.fromisoformat(value.replace("Z", "+00:00")) if isinstance(value, str) else value
+    if date.tzinfo is not None:
+        date = date.astimezone(timezone.utc).replace(tzinfo=None)
+    return date
+
+#filtra los archivos de un listado (formato de "openstack object list --long") por nombre, extension, tamaño y fecha
+#name acepta un texto contenido en el nombre o un patron glob (*, ?, [])
+#los tamaños van en bytes y las fechas en formato ISO (2024-11-25, 2024-11-25T18:30:00 o con zona horaria)
+def filter_objects(objects, name=None, extension=None, min_size=None, max_size=None, modified_after=None, modified_before=None):
+    name = name.lower() if name else None
+    is_glob = bool(name) and any(char in name for char in "*?[")
+    if extension:
+        extension = "." + extension.lower().lstrip(".")
+    modified_after = parse_utc_date(modified_after) if modified_after else None
+    modified_before = parse_utc_date(modified_before) if modified_before else None
+
+    for item in objects:
+        if not all(key in item for key in ["Name", "Last Modified", "Bytes"]) or item["Name"].endswith("/"):
+            continue
+        path = item["Name"].strip("/")
+        file_name = path.rsplit("/", 1)[-1].lower()
+
+        if name and not (fnmatch.fnmatchcase(file_name, name) if is_glob else name in file_name):
+            continue
+        if extension and not file_name.endswith(extension):
+            continue
+        if min_size is not None and item["Bytes"] < min_size:
+            continue
+        if max_size is not None and item["Bytes"] > max_size:
+            continue
+        try:
+            modified = parse_utc_date(item["Last Modified"])
+        except ValueError:
+            continue
+        if modified_after and modified < modified_after:
+            continue
+        if modified_before and modified > modified_before:
+            continue
 
-    return structure
\ No newline at end of file
+        yield {
+            "date": modified.strftime("%Y/%m/%d"),
+            "path": path,
+            "size": round(item["Bytes"] / 1024, 2),  # Convertir bytes a kilobytes
+            "last_modified": item["Last Modified"]
+        }
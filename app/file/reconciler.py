@@ -0,0 +1,254 @@
+#reconciliación en segundo plano del índice local de objetos con swift
+#recorre cada contenedor del índice por paginas (marker), corrige las diferencias y espera entre paginas para no saturar swift
+import os
+import tempfile
+import threading
+import time
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+from ..db.db import db, ContainerIndex, ObjectIndex, Student, Subject, Teacher, User
+from ..openstack.conteners import iter_container_listing
+from .cache import listing_cache
+from .index import normalize_name, parse_last_modified, utc_now
+
+# La reconciliación se activa con app.config['INDEX_RECONCILE'] (variable de entorno RACOON_INDEX_RECONCILE=1)
+# Archivo con el que los procesos de la aplicación acuerdan cuál corre la reconciliación
+RECONCILE_LOCK_FILE = os.path.join(tempfile.gettempdir(), 'racoon-index-reconciler.lock')
+# Segundos entre intentos de tomar el candado si otro proceso ya lo tiene
+RECONCILE_LOCK_RETRY = 60
+# Segundos de espera entre una vuelta completa y la siguiente
+RECONCILE_INTERVAL = 300
+# Objetos por pagina al listar un contenedor
+RECONCILE_PAGE_SIZE = 1000
+# Segundos de espera entre paginas, limita las peticiones por segundo a swift
+RECONCILE_PAGE_DELAY = 0.5
+
+#obtener el swift_scope de un contenedor del índice
+#account es la materia (swift_scope de la materia) o el espacio personal del usuario (openstack_id del usuario)
+def get_container_scope(account, container):
+    subject = Subject.query.filter_by(subject_name=account).first()
+    if subject:
+        return subject.swift_scope
+
+    user = None
+    student = Student.query.filter_by(boleta=container).first() if container.isdigit() else None
+    if student:
+        user = student.user
+    else:
+        teacher = Teacher.query.filter_by(rfc=container).first()
+        if teacher:
+            user = teacher.user
+        elif container.startswith('admin_') and container[len('admin_'):].isdigit():
+            user = User.query.get(int(container[len('admin_'):]))
+    return user.openstack_id if user else None
+
+# Reconciliador del índice con swift, corre en un hilo propio
+class IndexReconciler:
+    def __init__(self, interval=RECONCILE_INTERVAL, page_size=RECONCILE_PAGE_SIZE, page_delay=RECONCILE_PAGE_DELAY):
+        self.interval = interval
+        self.page_size = page_size
+        self.page_delay = page_delay
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.metrics = {
+            "rounds": 0,
+            "current_container": None,
+            "containers_total": 0,
+            "containers_done": 0,
+            "pages": 0,
+            "objects_checked": 0,
+            "added": 0,
+            "updated": 0,
+            "removed": 0,
+            "errors": 0,
+            "last_error": None,
+            "last_round_started": None,
+            "last_round_finished": None,
+            "last_round_seconds": None,
+        }
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.metrics[key] += amount
+
+    def set(self, **values):
+        with self.lock:
+            self.metrics.update(values)
+
+    #iniciar el hilo, las consultas a la base de datos necesitan el contexto de la aplicación
+    def start(self, app):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, args=(app,), name="index-reconciler", daemon=True)
+        self.thread.start()
+        print("Reconciliación del índice iniciada")
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self, app):
+        while not self.stop_event.is_set():
+            with app.app_context():
+                try:
+                    self.reconcile_all()
+                except Exception as e:
+                    print(f"Error en la reconciliación del índice: {e}")
+                    self.set(last_error=str(e))
+                finally:
+                    db.session.remove()
+            self.stop_event.wait(self.interval)
+
+    #una vuelta completa sobre todos los contenedores del índice, empezando por el más atrasado
+    def reconcile_all(self):
+        started = time.time()
+        containers = [(row.account, row.container) for row in ContainerIndex.query.order_by(ContainerIndex.indexed_at).all()]
+        self.set(last_round_started=utc_now().isoformat(), containers_total=len(containers), containers_done=0)
+
+        for account, container in containers:
+            if self.stop_event.is_set():
+                return
+            self.set(current_container=f"{account}/{container}")
+            try:
+                self.reconcile_container(account, container)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error al reconciliar '{account}/{container}': {e}")
+                self.count("errors")
+                self.set(last_error=f"{account}/{container}: {e}")
+            self.count("containers_done")
+
+        self.count("rounds")
+        self.set(current_container=None, last_round_finished=utc_now().isoformat(), last_round_seconds=round(time.time() - started, 2))
+
+    #comparar un contenedor con el índice pagina por pagina y corregir las diferencias
+    #las filas escritas por la API despues de empezar el recorrido no se tocan, ya son más recientes que el listado
+    def reconcile_container(self, account, container):
+        scope = get_container_scope(account, container)
+        if not scope:
+            raise Exception("No se encontró el swift_scope del contenedor")
+
+        walk_started = utc_now()
+        seen = set()
+        changed = False
+        for page in iter_container_listing(container, scope, account, limit=self.page_size):
+            if self.stop_event.is_set():
+                return
+            objects = {}
+            for obj in page:
+                name = normalize_name(obj['name'])
+                if name:
+                    objects[name] = obj
+            seen.update(objects)
+
+            rows = {row.name: row for row in ObjectIndex.query.filter(
+                ObjectIndex.account == account,
+                ObjectIndex.container == container,
+                ObjectIndex.name.in_(list(objects)),
+            ).all()}
+
+            for name, obj in objects.items():
+                row = rows.get(name)
+                # El slo_etag del listado viene entre comillas, en el índice se guarda sin ellas como en el HEAD
+                etag = (obj.get('slo_etag') or obj.get('hash') or '').strip('"') or None
+                if row is None:
+                    db.session.add(ObjectIndex(
+                        account=account, container=container, name=name,
+                        size=obj.get('bytes', 0), etag=etag, content_type=obj.get('content_type'),
+                        last_modified=parse_last_modified(obj.get('last_modified')),
+                    ))
+                    self.count("added")
+                    changed = True
+                elif row.last_modified and row.last_modified >= walk_started:
+                    continue
+                elif (row.size, row.etag, row.content_type) != (obj.get('bytes', 0), etag, obj.get('content_type')):
+                    row.size = obj.get('bytes', 0)
+                    # Si el contenido cambió el sha256 guardado ya no corresponde
+                    if row.etag != etag:
+                        row.sha256 = None
+                    row.etag = etag
+                    row.content_type = obj.get('content_type')
+                    row.last_modified = parse_last_modified(obj.get('last_modified'))
+                    self.count("updated")
+                    changed = True
+            db.session.commit()
+
+            self.count("pages")
+            self.count("objects_checked", len(objects))
+            self.stop_event.wait(self.page_delay)
+
+        # Las filas que swift ya no lista se eliminan
+        stale = [name for name, last_modified in db.session.query(ObjectIndex.name, ObjectIndex.last_modified).filter_by(account=account, container=container)
+                 if name not in seen and not (last_modified and last_modified >= walk_started)]
+        for start in range(0, len(stale), self.page_size):
+            ObjectIndex.query.filter(
+                ObjectIndex.account == account,
+                ObjectIndex.container == container,
+                ObjectIndex.name.in_(stale[start:start + self.page_size]),
+            ).delete(synchronize_session=False)
+        self.count("removed", len(stale))
+
+        marker = ContainerIndex.query.filter_by(account=account, container=container).first()
+        if marker:
+            marker.indexed_at = walk_started
+        db.session.commit()
+
+        if changed or stale:
+            print(f"Índice de '{account}/{container}' reconciliado")
+            listing_cache.invalidate(container, account)
+
+    #metricas de avance y atraso (segundos desde la reconciliación del contenedor más atrasado)
+    def stats(self):
+        with self.lock:
+            stats = dict(self.metrics)
+        stats["running"] = bool(self.thread and self.thread.is_alive())
+        oldest = db.session.query(db.func.min(ContainerIndex.indexed_at)).scalar()
+        stats["lag_seconds"] = round((utc_now() - oldest).total_seconds(), 2) if oldest else None
+        stats["indexed_containers"] = ContainerIndex.query.count()
+        return stats
+
+index_reconciler = IndexReconciler()
+
+# Candado entre procesos, se conserva abierto mientras viva el proceso que corre la reconciliación
+_reconciler_lock_file = None
+_reconciler_lock_checked = 0
+_reconciler_start_lock = threading.Lock()
+
+#tomar el candado entre procesos, solo un proceso (worker) de la aplicación corre la reconciliación
+#si ese proceso termina el sistema libera el candado y otro lo toma en su siguiente intento
+def acquire_reconciler_lock():
+    global _reconciler_lock_file
+    if _reconciler_lock_file is not None or fcntl is None:
+        return True
+    lock_file = open(RECONCILE_LOCK_FILE, 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _reconciler_lock_file = lock_file
+    return True
+
+#iniciar la reconciliación si esta activada en la configuración
+#se inicia con la primera petición que atiende el proceso, asi no corre en los comandos de flask
+#ni en el proceso que vigila los cambios del código (reloader), y el candado evita que corra en varios workers
+def start_reconciler(app):
+    if not app.config.get('INDEX_RECONCILE'):
+        return
+
+    @app.before_request
+    def start_reconciler_once():
+        global _reconciler_lock_checked
+        if index_reconciler.thread is not None:
+            return
+        if _reconciler_lock_checked and time.monotonic() - _reconciler_lock_checked < RECONCILE_LOCK_RETRY:
+            return
+        with _reconciler_start_lock:
+            if index_reconciler.thread is not None:
+                return
+            _reconciler_lock_checked = time.monotonic()
+            if acquire_reconciler_lock():
+                index_reconciler.start(app)
@@ -0,0 +1,210 @@
+#sesiones de subida por partes reanudables
+#cada parte se envía a swift como un segmento en cuanto llega y al finalizar se confirma un manifiesto SLO
+#las partes pueden llegar en paralelo, en cualquier orden y repetirse, el middleware no guarda copia en disco
+import hashlib
+import math
+import threading
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from ..db.db import db, UploadChunk, UploadSession
+from ..openstack.auth import swift_request
+from ..openstack.load import HashingReader, create_segments_container, get_segments_container, get_upload_url, put_slo_manifest, upload_stream_segment
+from ..openstack.object import bulk_delete_objects
+from .path_functions import content_md5_to_etag, verify_chunk_integrity
+
+# Tamaño de parte por defecto si el cliente no lo indica
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # 8 MB
+# Tamaño minimo de parte (el minimo de swift para los segmentos de un SLO)
+UPLOAD_MIN_CHUNK_SIZE = 1024 * 1024  # 1 MB
+# Horas que una sesión sin finalizar se conserva antes de descartarla
+UPLOAD_SESSION_TTL = 24
+
+# sha256 de todo el archivo por sesión, avanza mientras las partes llegan en orden a este proceso
+# {session_id: {"next": siguiente parte, "sha256": hash}}
+_file_hashes = {}
+_file_hashes_lock = threading.Lock()
+
+#nombre del segmento de una parte dentro del contenedor de segmentos
+def get_chunk_object_name(session_id, chunk_index):
+    return f"sesiones/{session_id}/{chunk_index:08d}"
+
+#crear una sesión y el contenedor de segmentos del usuario
+def create_upload_session(user_id, account, container, user_scope, file_path, file_name, file_size, chunk_size=UPLOAD_CHUNK_SIZE):
+    if file_size < 0:
+        raise ValueError("Tamaño de archivo inválido")
+    if chunk_size < UPLOAD_MIN_CHUNK_SIZE:
+        raise ValueError(f"El tamaño de parte minimo es {UPLOAD_MIN_CHUNK_SIZE} bytes")
+
+    session = UploadSession(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        account=str(account),
+        container=str(container),
+        user_scope=user_scope,
+        file_path=file_path,
+        file_name=file_name,
+        file_size=file_size,
+        chunk_size=chunk_size,
+        total_chunks=max(1, math.ceil(file_size / chunk_size)),
+        created_at=datetime.now(),
+    )
+
+    create_segments_container(session.container, user_scope, session.account)
+
+    db.session.add(session)
+    db.session.commit()
+    return session
+
+#obtener una sesión abierta del usuario, None si no existe o ya se cerró
+def get_upload_session(session_id, user_id):
+    session = UploadSession.query.get(session_id)
+    if not session or session.user_id != user_id or session.status != 'abierta':
+        return None
+    return session
+
+#tamaño que debe tener una parte, la ultima puede ser más chica
+def get_chunk_length(session, chunk_index):
+    return min(session.chunk_size, session.file_size - chunk_index * session.chunk_size)
+
+#validar que la parte corresponda a su posición dentro del archivo
+def validate_chunk(session, chunk_index, offset, length):
+    if chunk_index < 0 or chunk_index >= session.total_chunks:
+        raise ValueError(f"Índice de parte fuera de rango (0 - {session.total_chunks - 1})")
+    if offset != chunk_index * session.chunk_size:
+        raise ValueError(f"El offset de la parte {chunk_index} debe ser {chunk_index * session.chunk_size}")
+    if length != get_chunk_length(session, chunk_index):
+        raise ValueError(f"La parte {chunk_index} debe medir {get_chunk_length(session, chunk_index)} bytes")
+
+#registrar una parte recibida, si ya existia (reintento) se actualiza
+def record_chunk(session, chunk_index, size, etag):
+    chunk = UploadChunk.query.filter_by(session_id=session.id, chunk_index=chunk_index).first()
+    if chunk:
+        chunk.size = size
+        chunk.etag = etag
+        chunk.received_at = datetime.now()
+    else:
+        db.session.add(UploadChunk(session_id=session.id, chunk_index=chunk_index, size=size, etag=etag, received_at=datetime.now()))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Otra petición registró la misma parte al mismo tiempo
+        db.session.rollback()
+
+#descartar el registro de una parte que no pasó la verificación para que se vuelva a pedir
+def discard_chunk(session, chunk_index):
+    UploadChunk.query.filter_by(session_id=session.id, chunk_index=chunk_index).delete()
+    db.session.commit()
+
+#enviar una parte a swift como segmento directamente desde el cuerpo de la petición
+#si la conexión se corta swift rechaza el segmento, la parte no se registra y aparece como faltante
+#los hashes se calculan mientras se envía: content_md5 (base64) se manda a swift como ETag y sha256 se compara al terminar
+def write_chunk(session, chunk_index, offset, stream, length, sha256=None, content_md5=None):
+    validate_chunk(session, chunk_index, offset, length)
+    etag = content_md5_to_etag(content_md5) if content_md5 else None
+
+    # Si es la siguiente parte en orden se continua el sha256 de todo el archivo sobre una copia
+    with _file_hashes_lock:
+        state = _file_hashes.setdefault(session.id, {"next": 0, "sha256": hashlib.sha256()}) if chunk_index == 0 else _file_hashes.get(session.id)
+        file_hash = state["sha256"].copy() if state and state["next"] == chunk_index else None
+
+    previous = UploadChunk.query.filter_by(session_id=session.id, chunk_index=chunk_index).first()
+    previous_etag = previous.etag if previous else None
+
+    reader = HashingReader(stream, length, ('md5', 'sha256'), [file_hash] if file_hash else None)
+    segment_path = f"/{get_segments_container(session.container)}/{get_chunk_object_name(session.id, chunk_index)}"
+    try:
+        segment = upload_stream_segment(session.container, session.user_scope, session.account, segment_path, reader, length, etag)
+        if sha256 and not verify_chunk_integrity(reader.hashes['sha256'], sha256):
+            raise ValueError(f"El sha256 de la parte {chunk_index} no coincide")
+    except Exception:
+        # El segmento pudo quedar sobrescrito, la parte se marca como faltante
+        discard_chunk(session, chunk_index)
+        raise
+    record_chunk(session, chunk_index, length, segment["etag"])
+
+    with _file_hashes_lock:
+        state = _file_hashes.get(session.id)
+        if file_hash and state and state["next"] == chunk_index:
+            state["next"] = chunk_index + 1
+            state["sha256"] = file_hash
+        elif state and chunk_index < state["next"] and previous_etag != segment["etag"]:
+            # Una parte ya incluida cambió de contenido, el sha256 acumulado ya no es válido
+            _file_hashes.pop(session.id, None)
+    return reader.hexdigest('sha256')
+
+#sha256 de todo el archivo si todas las partes llegaron en orden a este proceso, None si no se pudo calcular
+def get_file_sha256(session):
+    with _file_hashes_lock:
+        state = _file_hashes.get(session.id)
+        if state and state["next"] == session.total_chunks:
+            return state["sha256"].hexdigest()
+    return None
+
+#indices de las partes que faltan por recibir
+def get_missing_chunks(session):
+    received = {chunk.chunk_index for chunk in UploadChunk.query.filter_by(session_id=session.id).all()}
+    return [index for index in range(session.total_chunks) if index not in received]
+
+#estado de una sesión para que el cliente sepa que partes reenviar
+def get_session_status(session):
+    missing = get_missing_chunks(session)
+    return {
+        "session_id": session.id,
+        "file_name": session.file_name,
+        "file_size": session.file_size,
+        "chunk_size": session.chunk_size,
+        "total_chunks": session.total_chunks,
+        "received_chunks": session.total_chunks - len(missing),
+        "missing_chunks": missing,
+        "status": session.status,
+        "sha256": get_file_sha256(session),
+    }
+
+#confirmar el archivo en swift con un manifiesto SLO que apunta a los segmentos ya subidos
+#regresa el nombre con el que quedó el objeto dentro del contenedor
+def finalize_session_object(session):
+    url = get_upload_url(session.container, session.user_scope, session.file_path, session.file_name)
+
+    # Un archivo vacío no tiene segmentos, se sube directamente
+    if session.file_size == 0:
+        response = swift_request('PUT', url, session.container, session.account, data=b'',
+                                 headers={'X-Object-Meta-Sha256': hashlib.sha256().hexdigest()})
+    else:
+        segments_container = get_segments_container(session.container)
+        manifest = [{
+            "path": f"/{segments_container}/{get_chunk_object_name(session.id, chunk.chunk_index)}",
+            "etag": chunk.etag,
+            "size_bytes": chunk.size,
+        } for chunk in UploadChunk.query.filter_by(session_id=session.id).order_by(UploadChunk.chunk_index).all()]
+        response = put_slo_manifest(session.container, session.account, url, manifest, get_file_sha256(session))
+
+    if response.status_code not in [201, 202]:
+        raise Exception(f"Error al confirmar el manifiesto: {response.status_code} - {response.text}")
+    return session.file_name if session.file_path == '' else '/' + session.file_path + '/' + session.file_name
+
+#cerrar una sesión y eliminar su registro de partes
+#si no se finalizó tambien se eliminan sus segmentos de swift
+def close_upload_session(session, status):
+    if status != 'finalizada':
+        names = [get_chunk_object_name(session.id, chunk.chunk_index) for chunk in UploadChunk.query.filter_by(session_id=session.id).all()]
+        if names:
+            try:
+                bulk_delete_objects(session.container, session.user_scope, session.account, names, get_segments_container(session.container))
+            except Exception as e:
+                print(f"Error al eliminar los segmentos de la sesión {session.id}: {e}")
+    session.status = status
+    UploadChunk.query.filter_by(session_id=session.id).delete()
+    db.session.commit()
+    with _file_hashes_lock:
+        _file_hashes.pop(session.id, None)
+
+#descartar las sesiones abiertas que pasaron su tiempo de vida
+def purge_expired_sessions():
+    expired = UploadSession.query.filter(
+        UploadSession.status == 'abierta',
+        UploadSession.created_at < datetime.now() - timedelta(hours=UPLOAD_SESSION_TTL),
+    ).all()
+    for session in expired:
+        print(f"Sesión de subida expirada: {session.id}")
+        close_upload_session(session, 'expirada')
@@ -1,11 +1,66 @@
 #regresa el token de autenticacion de openstack para las siguientes peticiones
 import json
+import threading
+from datetime import datetime, timedelta, timezone
 import requests
+from .client import http_session
 
+# Segundos antes de la expiracion en los que el token se considera vencido y se renueva
+TOKEN_REFRESH_MARGIN = 300
+
+# Cache de tokens por proceso: (user_identifier, project) -> (token, expires_at)
+_token_cache = {}
+# Un candado por llave para que varias peticiones simultaneas hagan una sola autenticacion
+_token_locks = {}
+_token_locks_guard = threading.Lock()
+
+def _get_token_lock(key):
+    with _token_locks_guard:
+        lock = _token_locks.get(key)
+        if lock is None:
+            lock = threading.Lock()
+            _token_locks[key] = lock
+        return lock
+
+#obtener el token de la cache si aun no esta por expirar
+def _get_cached_token(key):
+    cached = _token_cache.get(key)
+    if cached is None:
+        return None
+    token, expires_at = cached
+    if expires_at - timedelta(seconds=TOKEN_REFRESH_MARGIN) <= datetime.now(timezone.utc):
+        return None
+    return token
+
+#leer expires_at del cuerpo del token, ej. "2024-11-25T18:30:00.000000Z"
+def _parse_expires_at(response):
+    try:
+        expires_at = response.json()["token"]["expires_at"]
+        return datetime.fromisoformat(expires_at.replace("Z", "+00:00"))
+    except (ValueError, KeyError, TypeError):
+        return None
+
+#eliminar el token de la cache, por ejemplo cuando swift responde 401
+def invalidate_token(user_identifier, project):
+    _token_cache.pop((str(user_identifier), str(project)), None)
+
+#regresa el token de la cache o se autentica en keystone si no hay uno vigente
 def openstack_auth_id(user_identifier, project):
+    key = (str(user_identifier), str(project))
+    token = _get_cached_token(key)
+    if token:
+        return token
+
+    with _get_token_lock(key):
+        # Otra peticion pudo haber obtenido el token mientras se esperaba el candado
+        token = _get_cached_token(key)
+        if token:
+            return token
+        return _request_token(*key)
+
+#realiza la autenticacion con usuario y contraseña en keystone
+def _request_token(user_identifier, project):
     # Define los datos de autenticación
-    user_identifier=str(user_identifier)
-    project = str(project)
     # print(user_identifier)
     auth_url = "http://192.168.1.104:5000/v3/auth/tokens"
     data = { 
@@ -42,24 +97,57 @@ def openstack_auth_id(user_identifier, project):
 
     # Realiza la solicitud de autenticación
     headers = {"Content-Type": "application/json"}
-    response = requests.post(auth_url, headers=headers, data=json.dumps(data))
+    response = http_session.post(auth_url, headers=headers, data=json.dumps(data))
 
     # Comprueba si la solicitud fue exitosa
     if response.status_code == 201:
         token = response.headers["X-Subject-Token"]
         # print("Token de autenticación obtenido:", token)
+        expires_at = _parse_expires_at(response)
+        if expires_at is not None:
+            _token_cache[(user_identifier, project)] = (token, expires_at)
         return token
     else:
         # print("Error en la autenticación:", response.status_code, response.text)
         return response.status_code
 
+#saber si un cuerpo se puede regresar al inicio para reenviarlo
+#SpooledTemporaryFile no tiene seekable() antes de python 3.11
+def is_seekable(stream):
+    return stream.seekable() if hasattr(stream, 'seekable') else hasattr(stream, 'seek')
+
+#peticion a swift con el token del usuario, si swift responde 401 se descarta el token y se reintenta una vez
+#un cuerpo que no se puede releer (por ejemplo el stream de la peticion) no se reintenta y se regresa el 401
+def swift_request(method, url, user_identifier, project, headers=None, **kwargs):
+    for attempt in range(2):
+        token = openstack_auth_id(user_identifier, project)
+        if not isinstance(token, str):
+            raise Exception(f"Error en la autenticación: {token}")
+
+        request_headers = dict(headers or {})
+        request_headers['X-Auth-Token'] = token
+        response = http_session.request(method, url, headers=request_headers, **kwargs)
+        if response.status_code != 401 or attempt == 1:
+            return response
+
+        print("Token rechazado por swift, se solicitara uno nuevo")
+        invalidate_token(user_identifier, project)
+        # Regresar al inicio el cuerpo si es un archivo para poder reenviarlo
+        data = kwargs.get('data')
+        if data is not None and not isinstance(data, (bytes, str, dict)):
+            if not is_seekable(data):
+                print("El cuerpo ya se envió y no se puede reenviar")
+                return response
+            data.seek(0)
+    return response
+
 #funcion que obtiene el id de un usuario en openstack
 def get_id_scope(token, nombre):
     auth_url = "http://192.168.1.104:5000/v3/users/"
     headers = {"X-Auth-Token": token}  # Corregido para usar el valor de la variable `token`
 
     try:
-        response = requests.get(auth_url, headers=headers)
+        response = http_session.get(auth_url, headers=headers)
     except requests.exceptions.RequestException as e:
         print(f"Error al realizar la solicitud HTTP: {e}")
         return None
@@ -0,0 +1,40 @@
+#sesion http compartida para las peticiones a swift, keystone y al api controller
+#reutiliza conexiones (keep-alive) en lugar de abrir una conexion tcp por cada peticion
+import requests
+from requests.adapters import HTTPAdapter
+
+# Direcciones de los servicios
+SWIFT_URL = "http://192.168.1.104:8080"
+KEYSTONE_URL = "http://192.168.1.104:5000"
+CONTROLLER_URL = "http://localhost:10000"
+
+# Conexiones abiertas que se conservan por host
+POOL_SIZE = {
+    SWIFT_URL: 32,
+    KEYSTONE_URL: 8,
+    CONTROLLER_URL: 8,
+}
+DEFAULT_POOL_SIZE = 10
+
+# Tiempos de espera en segundos (conexion, lectura)
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 120
+
+# Sesion que aplica los tiempos de espera por defecto a todas las peticiones
+class PooledSession(requests.Session):
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', (CONNECT_TIMEOUT, READ_TIMEOUT))
+        return super().request(method, url, **kwargs)
+
+def create_session():
+    session = PooledSession()
+    default_adapter = HTTPAdapter(pool_connections=len(POOL_SIZE) + 1, pool_maxsize=DEFAULT_POOL_SIZE)
+    session.mount("http://", default_adapter)
+    session.mount("https://", default_adapter)
+    # Un adaptador por host para poder configurar el tamaño de su pool
+    for host, size in POOL_SIZE.items():
+        session.mount(host + "/", HTTPAdapter(pool_connections=1, pool_maxsize=size))
+    return session
+
+# Sesion compartida por todo el proceso
+http_session = create_session()
@@ -5,15 +5,19 @@ from flask import Blueprint, after_this_request, request, jsonify, send_file, ab
 from pathlib import Path
 from flask_jwt_extended import get_jwt_identity, jwt_required
 import requests
-from app.openstack.auth import openstack_auth_id
+from app.openstack.auth import swift_request
+from app.openstack.client import SWIFT_URL, http_session
 from ..db.path import *
 
+# Objetos por pagina al listar un contenedor directamente en swift
+CONTAINER_PAGE_SIZE = 1000
+
 #crear proyecto en openstack
 def create_project(project_id):
     fetch_url = "http://localhost:10000/project/"
     data = {"project": project_id}
     try:
-        response = requests.post(fetch_url, json=data)
+        response = http_session.post(fetch_url, json=data)
         
         # Verifica si la respuesta fue exitosa (código 200)
         response.raise_for_status()  # Lanza una excepción si la respuesta tiene un error
@@ -46,7 +50,7 @@ def assigment_role(user_id, project_id, role):
     try:
         print("Se intentará asignar el rol")
         print("data", data)
-        response = requests.post(fetch_url, json=data)
+        response = http_session.post(fetch_url, json=data)
         
         # Verifica si la respuesta fue exitosa (código 200)
         response.raise_for_status()  # Lanza una excepción si la respuesta tiene un error
@@ -65,19 +69,12 @@ def assigment_role(user_id, project_id, role):
 
 #obtener tamaño del contenedor en openstack
 def size_container(user, user_scope, project):
-    token = openstack_auth_id(str(user), project)
-    if token:
-        print("Token de autenticación obtenido:")
-
     print(project)
 
     url = f"http://192.168.1.104:8080/v1/{user_scope}/{user}/"
     print(url)
-    headers = {
-        'X-Auth-Token': token,
-    }
     #metodo head en el request para obtener el tamaño del contenedor
-    response = requests.get(url, headers=headers)
+    response = swift_request('GET', url, user, project)
     #obtener Content-Length del header
     try:
         size = response.headers.get('X-Container-Bytes-Used')
@@ -95,12 +92,58 @@ def size_container(user, user_scope, project):
 
 
 
+#consultar los metadatos de un contenedor con HEAD (numero de objetos, bytes usados y fechas)
+#regresa las cabeceras de swift o None si no se pudieron obtener
+def head_container(user, user_scope, project):
+    url = f"{SWIFT_URL}/v1/{user_scope}/{user}"
+    try:
+        response = swift_request('HEAD', url, user, project)
+    except Exception as e:
+        print("Error al consultar el contenedor:", e)
+        return None
+    if response.status_code not in [200, 204]:
+        print("Error al consultar el contenedor:", response.status_code)
+        return None
+    return response.headers
+
+#recorrer el listado de un contenedor directamente en swift, pagina por pagina usando marker
+def iter_container_listing(user, user_scope, project, prefix=None, marker=None, limit=CONTAINER_PAGE_SIZE):
+    url = f"{SWIFT_URL}/v1/{user_scope}/{user}"
+    while True:
+        params = {'format': 'json', 'limit': limit}
+        if prefix:
+            params['prefix'] = prefix
+        if marker:
+            params['marker'] = marker
+        response = swift_request('GET', url, user, project, params=params)
+        if response.status_code == 204:
+            return
+        if response.status_code != 200:
+            raise Exception(f"Error al listar el contenedor: {response.status_code} - {response.text}")
+        page = response.json()
+        if not page:
+            return
+        yield page
+        if len(page) < limit:
+            return
+        marker = page[-1]['name']
+
+#resumen de un contenedor: numero de objetos, bytes y fecha de la ultima modificacion
+def summarize_container(user, user_scope, project):
+    summary = {"objects": 0, "bytes": 0, "last_modified": None}
+    for page in iter_container_listing(user, user_scope, project):
+        for obj in page:
+            # Los marcadores de carpeta no cuentan como archivos
+            if obj['name'].endswith("/"):
+                continue
+            summary["objects"] += 1
+            summary["bytes"] += obj.get('bytes', 0)
+            if obj.get('last_modified') and (summary["last_modified"] is None or obj['last_modified'] > summary["last_modified"]):
+                summary["last_modified"] = obj['last_modified']
+    return summary
+
 #crear carpeta virtual en openstack
 def create_path(user, user_scope, project, full_path, path_name):
-    token = openstack_auth_id(str(user), project)
-    if token:
-        print("Token de autenticación obtenido:")
-
     print(project)
     print("full_path_recibido", full_path)
     print("path_name_recibido", path_name) 
@@ -120,11 +163,8 @@ def create_path(user, user_scope, project, full_path, path_name):
     # url = f"192.168.1.104:5000/v1/{user}/{object_name}"
     url = f"http://192.168.1.104:8080/v1/{user_scope}/{user}/{path_name}"
     print(url)
-    headers = {
-        'X-Auth-Token': token,
-    }
 
-    response = requests.put(url, headers=headers, data=empty_file.getvalue())
+    response = swift_request('PUT', url, user, project, data=empty_file.getvalue())
     # response = requests.get(url, headers=headers)
     print(response.status_code)
     if response.status_code not in [201, 202, 204]:
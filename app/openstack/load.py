@@ -1,45 +1,272 @@
+import hashlib
 import json
 import os
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from flask import Blueprint,request, jsonify
 from pathlib import Path
+from urllib.parse import quote
 
-from app.openstack.object import get_object_list_by_path
-from .auth import openstack_auth_id
+from app.openstack.object import bulk_delete_objects, get_object_list_by_path
+from .auth import is_seekable, swift_request
+from .client import SWIFT_URL
 import requests
 
 upload_bp = Blueprint('upload', __name__)
 
+# Archivos mayores a este tamaño se suben a swift como Static Large Object (SLO)
+SLO_THRESHOLD = 1 * 1024 * 1024 * 1024  # 1 GB
+# Tamaño de cada segmento del SLO
+SLO_SEGMENT_SIZE = 100 * 1024 * 1024  # 100 MB
+# Segmentos que se suben al mismo tiempo
+SLO_WORKERS = 4
+# Intentos por segmento antes de cancelar la subida
+SEGMENT_RETRIES = 3
+# Objetos de una carpeta que se descargan al mismo tiempo
+FOLDER_DOWNLOAD_WORKERS = 8
+# Objetos de hasta este tamaño se descargan completos por adelantado para el zip
+# los mayores se leen por bloques cuando les toca, asi la memoria queda limitada a FOLDER_DOWNLOAD_WORKERS * este tamaño
+ZIP_PREFETCH_MAX_SIZE = 4 * 1024 * 1024  # 4 MB
+# Tamaño de bloque con el que se leen los objetos que se agregan a un zip
+ZIP_CHUNK_SIZE = 64 * 1024  # 64 KB
+# Objetos de este tamaño o mayores se escriben en el zip con extensiones ZIP64
+ZIP64_THRESHOLD = 1 * 1024 * 1024 * 1024  # 1 GB
+# Tamaño de bloque con el que se lee un segmento del disco
+READ_BLOCK_SIZE = 1024 * 1024  # 1 MB
+
+# Lector de una porcion del archivo para enviarla como cuerpo de la peticion sin cargarla en memoria
+class FileSegment:
+    def __init__(self, file, offset, size):
+        self.file = file
+        self.offset = offset
+        self.size = size
+        self.seek(0)
+
+    def __len__(self):
+        return self.size
+
+    def seek(self, position, whence=0):
+        self.position = position
+        self.file.seek(self.offset + position)
+
+    def read(self, size=-1):
+        remaining = self.size - self.position
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        data = self.file.read(size)
+        self.position += len(data)
+        return data
+
+    def __iter__(self):
+        while True:
+            block = self.read(READ_BLOCK_SIZE)
+            if not block:
+                break
+            yield block
+
+# Lector que calcula los hashes del contenido conforme se envia, sin una segunda lectura
+# carry son hashes de todo el archivo que vienen de partes anteriores y se continuan con esta
+class HashingReader:
+    def __init__(self, stream, size, algorithms=('md5',), carry=None):
+        self.stream = stream
+        self.size = size
+        self.position = 0
+        self.hashes = {name: hashlib.new(name) for name in algorithms}
+        self.carry = carry or []
+
+    def __len__(self):
+        return self.size
+
+    #solo se puede regresar al inicio si no continua hashes de otras partes y el stream se puede releer
+    def seekable(self):
+        return not self.carry and is_seekable(self.stream)
+
+    def seek(self, position, whence=0):
+        if position != 0 or whence != 0 or self.carry:
+            raise OSError("El contenido solo se puede releer desde el inicio")
+        self.stream.seek(0)
+        self.position = 0
+        self.hashes = {name: hashlib.new(name) for name in self.hashes}
+
+    def read(self, size=-1):
+        remaining = self.size - self.position
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        data = self.stream.read(size)
+        self.position += len(data)
+        for hash_object in list(self.hashes.values()) + self.carry:
+            hash_object.update(data)
+        return data
+
+    def __iter__(self):
+        while True:
+            block = self.read(READ_BLOCK_SIZE)
+            if not block:
+                break
+            yield block
+
+    def hexdigest(self, name='md5'):
+        return self.hashes[name].hexdigest()
+
+#verificar que el ETag que regresa swift sea el md5 de lo que se envió
+def verify_response_etag(response, reader, object_name):
+    etag = (response.headers.get('Etag') or '').strip('"')
+    if etag and etag != reader.hexdigest('md5'):
+        raise Exception(f"El ETag de '{object_name}' no coincide con el contenido enviado ({etag} != {reader.hexdigest('md5')})")
+    if reader.position != reader.size:
+        raise Exception(f"Se enviaron {reader.position} de {reader.size} bytes de '{object_name}'")
+
+#nombre del contenedor donde se guardan los segmentos de los objetos grandes
+def get_segments_container(user):
+    return f"{user}_segments"
+
+#crear el contenedor de segmentos si no existe
+def create_segments_container(user, user_scope, project):
+    response = swift_request('PUT', f"{SWIFT_URL}/v1/{user_scope}/{get_segments_container(user)}", user, project)
+    if response.status_code not in [201, 202, 204]:
+        raise Exception(f"Error al crear el contenedor de segmentos: {response.status_code} - {response.text}")
+
+#subir un segmento del archivo, reintentando solo ese segmento si falla
+def upload_segment(user, user_scope, project, full_path, segment_path, offset, size):
+    url = f"{SWIFT_URL}/v1/{user_scope}{segment_path}"
+    last_error = None
+    for attempt in range(SEGMENT_RETRIES):
+        try:
+            with open(full_path, 'rb') as f:
+                segment = HashingReader(FileSegment(f, offset, size), size)
+                response = swift_request('PUT', url, user, project, data=segment, headers={'Content-Length': str(size)})
+            if response.status_code in [201, 202]:
+                # Si el segmento no llegó igual se vuelve a intentar
+                verify_response_etag(response, segment, segment_path)
+                return {"path": segment_path, "etag": segment.hexdigest('md5'), "size_bytes": size}
+            last_error = f"{response.status_code} - {response.text}"
+        except Exception as e:
+            last_error = str(e)
+        print(f"Error al subir el segmento '{segment_path}' (intento {attempt + 1}): {last_error}")
+    raise Exception(f"Error al subir el segmento '{segment_path}': {last_error}")
+
+#subir un archivo grande como Static Large Object, los segmentos se suben en paralelo y al final el manifiesto
+def upload_large_file_openstack(user, user_scope, project, url, full_path, file_size, sha256=None):
+    object_name = url.split(f"/{user}/", 1)[1].lstrip("/")
+    segments_container = get_segments_container(user)
+    create_segments_container(user, user_scope, project)
+
+    # Los segmentos de cada subida quedan bajo un prefijo propio para no mezclarse con subidas anteriores
+    prefix = f"{object_name}/{time.time():.6f}/{file_size}"
+    offsets = range(0, file_size, SLO_SEGMENT_SIZE)
+    segment_names = [f"{prefix}/{index:08d}" for index in range(len(offsets))]
+    print(f"Subiendo '{object_name}' como SLO en {len(offsets)} segmentos")
+
+    try:
+        with ThreadPoolExecutor(max_workers=SLO_WORKERS) as executor:
+            futures = [
+                executor.submit(upload_segment, user, user_scope, project, full_path,
+                                f"/{segments_container}/{name}", offset, min(SLO_SEGMENT_SIZE, file_size - offset))
+                for name, offset in zip(segment_names, offsets)
+            ]
+            manifest = [future.result() for future in futures]
+
+        # Confirmar el manifiesto del SLO
+        response = put_slo_manifest(user, project, url, manifest, sha256)
+    except Exception:
+        delete_orphan_segments(user, user_scope, project, segment_names)
+        raise
+    if response.status_code not in [201, 202]:
+        delete_orphan_segments(user, user_scope, project, segment_names)
+    return response
+
+#eliminar los segmentos de una subida que no se pudo confirmar, ningun manifiesto apunta a ellos
+def delete_orphan_segments(user, user_scope, project, segment_names):
+    try:
+        result = bulk_delete_objects(user, user_scope, project, segment_names, get_segments_container(user))
+        if result["errors"]:
+            print(f"Segmentos que no se pudieron eliminar: {result['errors']}")
+    except Exception as e:
+        print(f"Error al eliminar los segmentos de la subida: {e}")
+
+#confirmar el manifiesto de un SLO, swift valida cada segmento sin volver a transferir los datos
+#el ETag del manifiesto es el md5 de los ETag de los segmentos concatenados, swift lo rechaza si no coincide
+#sha256 es el del contenido completo, se guarda como metadato para encontrar duplicados
+def put_slo_manifest(user, project, url, manifest, sha256=None):
+    etag = hashlib.md5("".join(segment["etag"] for segment in manifest).encode('utf-8')).hexdigest()
+    headers = {'Content-Type': 'application/json', 'ETag': etag}
+    if sha256:
+        headers['X-Object-Meta-Sha256'] = sha256
+    return swift_request('PUT', url, user, project, params={'multipart-manifest': 'put'}, data=json.dumps(manifest), headers=headers)
+
+#subir un segmento directamente desde un stream (el cuerpo de una peticion) sin guardarlo en disco
+#el stream solo se puede leer una vez, si falla el cliente debe reenviar la parte
+#con etag (md5 que manda el cliente) swift rechaza el segmento si el contenido no coincide
+def upload_stream_segment(user, user_scope, project, segment_path, stream, size, etag=None):
+    url = f"{SWIFT_URL}/v1/{user_scope}{segment_path}"
+    reader = stream if isinstance(stream, HashingReader) else HashingReader(stream, size)
+    headers = {'Content-Length': str(size)}
+    if etag:
+        headers['ETag'] = etag
+    response = swift_request('PUT', url, user, project, data=reader, headers=headers)
+    if response.status_code == 422:
+        raise ValueError(f"El contenido del segmento '{segment_path}' no coincide con su md5")
+    if response.status_code not in [201, 202]:
+        raise Exception(f"Error al subir el segmento '{segment_path}': {response.status_code} - {response.text}")
+    verify_response_etag(response, reader, segment_path)
+    return {"path": segment_path, "etag": reader.hexdigest('md5'), "size_bytes": size}
+
+#subir un archivo copiando en el servidor un objeto de la misma cuenta que ya tiene el mismo contenido, sin transferir los bytes
+#si el origen es un SLO solo se copia su manifiesto y la copia apunta a los mismos segmentos
+def copy_existing_object(user, user_scope, project, source_container, source_name, file_path, file_name, is_manifest=False):
+    url = get_upload_url(user, user_scope, file_path, file_name)
+    headers = {'X-Copy-From': quote(f"/{source_container}/{source_name}"), 'Content-Length': '0'}
+    params = {'multipart-manifest': 'get'} if is_manifest else None
+    response = swift_request('PUT', url, user, project, params=params, headers=headers, data=b'')
+    if response.status_code not in [201, 202]:
+        raise Exception(f"Error al copiar '{source_container}/{source_name}': {response.status_code} - {response.text}")
+    return response
+
+#url destino de un archivo que se sube al contenedor del usuario
+def get_upload_url(user, user_scope, file_path, file_name):
+    if file_path == '':
+        return f"{SWIFT_URL}/v1/{user_scope}/{user}/{file_name}"
+    return f"{SWIFT_URL}/v1/{user_scope}/{user}//{file_path}/{file_name}"
+
 #subir archivo a un contenedor en openstack
-def upload_file_openstack(user, user_scope, project, file_path, full_path, file_name):
+#etag es el md5 del archivo si ya se conoce, swift rechaza el objeto si el contenido no coincide
+#sha256 se guarda como metadato del objeto para encontrar duplicados
+def upload_file_openstack(user, user_scope, project, file_path, full_path, file_name, etag=None, sha256=None):
     
     print("project", project)
-    token = openstack_auth_id(str(user), project)
-    print(token)
     print("file_path_recibido", file_path)
     print("file_name_recibido", file_name)
     print("full_path_recibido", full_path)
 
-    with open(full_path, 'rb') as f:
-        data = f.read()
-        
-    
     print("file_name ",file_name)
     # Contar las barras diagonales (considerando ambas / y \)
     count_slashes = file_name.count("/") + file_name.count("\\")
     # url = f"192.168.1.104:5000/v1/{user}/{object_name}"
-    if file_path == '':
-        url = f"http://192.168.1.104:8080/v1/{user_scope}/{user}/{file_name}"
-    else:
+    url = get_upload_url(user, user_scope, file_path, file_name)
+    if file_path != '':
         file_name = file_path + '/' + file_name
-        url = f"http://192.168.1.104:8080/v1/{user_scope}/{user}//{file_name}"
 
     # url = f"http://192.168.1.104:8080/v1/{user_scope}/{user}{file_name}"
     print(url)
-    headers = {
-        'X-Auth-Token': token,
-    }
 
-    response = requests.put(url, headers=headers, data=data)
+    file_size = os.path.getsize(full_path)
+    if file_size > SLO_THRESHOLD:
+        response = upload_large_file_openstack(user, user_scope, project, url, full_path, file_size, sha256)
+    else:
+        # Enviar el archivo directamente desde el disco por bloques, sin cargarlo completo en memoria
+        headers = {'Content-Length': str(file_size)}
+        if etag:
+            headers['ETag'] = etag
+        if sha256:
+            headers['X-Object-Meta-Sha256'] = sha256
+        with open(full_path, 'rb') as f:
+            reader = HashingReader(f, file_size)
+            response = swift_request('PUT', url, user, project, data=reader, headers=headers)
+        if response.status_code in [201, 202]:
+            verify_response_etag(response, reader, file_name)
     # response = requests.get(url, headers=headers)
     print(response.status_code)
     if response.status_code not in [201, 202, 204]:
@@ -48,16 +275,59 @@ def upload_file_openstack(user, user_scope, project, file_path, full_path, file_
         print(f"Objeto '{file_name}' subido exitosamente a '{user}'.")
         return jsonify({"message": f"Objeto '{file_name}' subido exitosamente a '{user}'."}), 201
 
+#subir un archivo a swift directamente desde un stream (un archivo recibido o el cuerpo de la peticion) sin copiarlo a disco
+#si el stream se puede releer (archivos que werkzeug ya guardó) primero se calculan sus hashes para mandarlos con el PUT,
+#si no, se calculan mientras se envía y el sha256 se guarda despues como metadato
+#regresa el md5 y el sha256 del contenido
+def upload_stream_openstack(user, user_scope, project, file_path, file_name, stream, size):
+    url = get_upload_url(user, user_scope, file_path, file_name)
+    headers = {'Content-Length': str(size)}
+    if is_seekable(stream):
+        md5, sha256 = hashlib.md5(), hashlib.sha256()
+        for block in iter(lambda: stream.read(READ_BLOCK_SIZE), b''):
+            md5.update(block)
+            sha256.update(block)
+        stream.seek(0)
+        headers['ETag'] = md5.hexdigest()
+        headers['X-Object-Meta-Sha256'] = sha256.hexdigest()
+
+    reader = HashingReader(stream, size, ('md5', 'sha256'))
+    response = swift_request('PUT', url, user, project, data=reader, headers=headers)
+    if response.status_code == 422:
+        raise ValueError(f"El contenido de '{file_name}' no coincide con su md5")
+    if response.status_code not in [201, 202]:
+        raise Exception(f"Error al subir el objeto: {response.status_code} - {response.text}")
+    verify_response_etag(response, reader, file_name)
+
+    if 'X-Object-Meta-Sha256' not in headers:
+        meta = swift_request('POST', url, user, project, headers={'X-Object-Meta-Sha256': reader.hexdigest('sha256')})
+        if meta.status_code not in [202, 204]:
+            print(f"No se pudo guardar el sha256 de '{file_name}': {meta.status_code}")
+    print(f"Objeto '{file_name}' subido exitosamente a '{user}'.")
+    return reader.hexdigest('md5'), reader.hexdigest('sha256')
+
+#url de un objeto dentro del contenedor del usuario
+def get_object_url(user, user_scope, file_name):
+    # Contar las barras diagonales (considerando ambas / y \)
+    count_slashes = file_name.count("/") + file_name.count("\\")
+    #si file name empieza con una barra
+    if count_slashes > 1:
+        file_name = '/' + file_name
+    return f"{SWIFT_URL}/v1/{user_scope}/{user}/{file_name}"
+
+#abrir la descarga de un objeto sin guardarlo en disco, regresa la respuesta de swift para leerla por partes
+def stream_file_openstack(user, user_scope, project, file_name, headers=None):
+    url = get_object_url(user, user_scope, file_name)
+    print(url)
+    return swift_request('GET', url, user, project, headers=headers, stream=True)
+
 #descargar archivo de un contenedor en openstack    
 def download_file_openstack(user, user_scope, project, file_path, file_name, save_directory):
     
-  # Obtener el token de autenticación de OpenStack
     print("user", user)
     print("user_scope", user_scope)
     print("project", project)
 
-    token = openstack_auth_id(str(user), project)
-    print(token)
     # Construir la ruta completa del archivo en el contenedor
     file_full_path = f"{file_path}/{file_name}"
     print(f"Descargando archivo: {file_name}")
@@ -67,24 +337,12 @@ def download_file_openstack(user, user_scope, project, file_path, file_name, sav
     # Asegurarte de limpiar barras iniciales en file_name
     #saber si un file_name tiene una barra al inicio
     
-    # Contar las barras diagonales (considerando ambas / y \)
-    count_slashes = file_name.count("/") + file_name.count("\\")
-
     # URL de descarga del archivo desde OpenStack Swift
-    #si file name empieza con una barra
-    if count_slashes > 1:
-        file_name = '/' + file_name
-        url = f"http://192.168.1.104:8080/v1/{user_scope}/{user}/{file_name}"
-    else:
-        url = f"http://192.168.1.104:8080/v1/{user_scope}/{user}/{file_name}"
+    url = get_object_url(user, user_scope, file_name)
     print(url)
 
-    headers = {
-        'X-Auth-Token': token,
-    }
-
     # Realizar la solicitud GET para descargar el archivo
-    response = requests.get(url, headers=headers, stream=True)
+    response = swift_request('GET', url, user, project, stream=True)
     print(response.status_code)
     # Verificar el estado de la respuesta
     if response.status_code == 200:
@@ -116,95 +374,133 @@ def download_file_openstack(user, user_scope, project, file_path, file_name, sav
     
     # Descargar archivos de un directorio virtual dentro de un contenedor de OpenStack
 
-#descargar archivos de un directorio virtual dentro de un contenedor de OpenStack
-def download_path_openstack(user, user_scope, project, file_path, save_directory):
+# Destino de escritura del zip que guarda los bytes generados hasta que se envian al cliente
+class ZipStreamBuffer:
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer.extend(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+#fecha de modificacion de un objeto del listado de swift para la entrada del zip
+def get_zip_date_time(obj):
     try:
-        # Obtener el token de autenticación de OpenStack
-        token = openstack_auth_id(user, project)
+        return datetime.fromisoformat(obj['last_modified']).timetuple()[:6]
+    except (KeyError, TypeError, ValueError):
+        return time.localtime()[:6]
 
-        # Obtener la lista de archivos en un directorio
-        objects = get_object_list_by_path(user, project, file_path)
-        # objects = objects.get('data', [])
-        
-        if not objects:
-            raise Exception("No se encontraron archivos en el directorio especificado.")
-        # print("objects", objects)
-        #imprimir con formato json
-        print(json.dumps(objects, indent=4))
-        # Iterar sobre los archivos y descargarlos
-        for obj in objects:
-            file_name = obj['name'].lstrip("/\\")
-            if file_name.endswith("/"):
-                continue
-            url = f"http://192.168.1.104:8080/v1/{user_scope}/{user}//{file_name}"
-            print('\nurl: ',url)
-
-            headers = {'X-Auth-Token': token}
-
-            # Solicitar el archivo al servidor
-            response = requests.get(url, headers=headers, stream=True)
-            if response.status_code == 200:
-                # Crear directorios locales según sea necesario
-                save_directory = os.path.normpath(save_directory)
-                file_name = os.path.normpath(file_name)
-                
-                print("save_directory", save_directory)
-                print("file_name", file_name)
-
-                # common_path = os.path.commonpath([save_directory, file_name])
-                
-                # print("common_path", common_path)
-
-                #obtener nombre del archivo
-                # file_name = os.path.basename(file_name)
-
-                print("file_name", file_name)
-
-                local_file_path = os.path.join(save_directory, file_name)
-                local_file_path = os.path.normpath(local_file_path)
-                os.makedirs(os.path.dirname(local_file_path), exist_ok=True)
-                print(f"Guardando archivo en: {local_file_path}\n")   
-                # Guardar el archivo
-                with open(local_file_path, 'wb') as file:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        file.write(chunk)
-
-                print(f"Archivo '{file_name}' descargado exitosamente en '{local_file_path}'.")
-            else:
-                print(f"Error al descargar '{file_name}': {response.status_code} - {response.text}")
-    except Exception as e:
-        print(f"Error en el proceso de descarga: {e}")
+#abrir la descarga de un objeto de la carpeta para el zip
+#si el objeto es chico se descarga completo y se regresan sus bytes, si no se regresa la respuesta para leerla por bloques
+def fetch_zip_object(user, user_scope, project, file_name, size):
+    url = f"{SWIFT_URL}/v1/{user_scope}/{user}//{file_name}"
+    response = swift_request('GET', url, user, project, stream=True)
+    if response.status_code != 200:
+        response.close()
+        raise Exception(response.status_code)
+    if size > ZIP_PREFETCH_MAX_SIZE:
+        return response
+    try:
+        return response.content
+    finally:
+        response.close()
+
+#generar un zip de los objetos de una carpeta mientras se descargan de swift, sin escribir en disco
+#los objetos chicos se descargan por adelantado en paralelo (FOLDER_DOWNLOAD_WORKERS a la vez) y se escriben en orden
+#el zip se escribe sin posicionarse en el archivo, por lo que cada entrada usa data descriptor
+#prefix es la carpeta terminada en "/", solo se incluyen sus objetos y no los de carpetas con nombre parecido (tarea1 y tarea10)
+#los nombres dentro del zip son relativos a la raiz del contenedor, con la ruta completa de la carpeta
+def stream_path_zip_openstack(user, user_scope, project, objects, prefix=None):
+    buffer = ZipStreamBuffer()
+    errors = []
+    prefix = prefix.lstrip("/\\") if prefix else ""
+    objects = [obj for obj in objects
+               if obj['name'].lstrip("/\\").startswith(prefix) and not obj['name'].lstrip("/\\").endswith("/")]
+    pending = deque()
+    executor = ThreadPoolExecutor(max_workers=FOLDER_DOWNLOAD_WORKERS)
+
+    #pedir por adelantado los siguientes objetos chicos hasta llenar la ventana
+    def prefetch(queued):
+        while queued < len(objects) and len(pending) < FOLDER_DOWNLOAD_WORKERS:
+            obj = objects[queued]
+            future = None
+            if obj.get('bytes', 0) <= ZIP_PREFETCH_MAX_SIZE:
+                future = executor.submit(fetch_zip_object, user, user_scope, project, obj['name'].lstrip("/\\"), obj.get('bytes', 0))
+            pending.append((obj, future))
+            queued += 1
+        return queued
 
-#Eliminar carpeta y su contenido de un contenedor en openstack 
-def delete_path_openstack(user, user_scope, project, file_path):
     try:
-        # Obtener el token de autenticación de OpenStack
-        token = openstack_auth_id(user, project)
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+            queued = prefetch(0)
+            while pending:
+                obj, future = pending.popleft()
+                queued = prefetch(queued)
+                file_name = obj['name'].lstrip("/\\")
+                try:
+                    # Los objetos grandes se abren hasta que les toca para no dejar conexiones esperando
+                    content = future.result() if future else fetch_zip_object(user, user_scope, project, file_name, obj.get('bytes', 0))
+                except Exception as e:
+                    errors.append(f"{file_name}: {e}")
+                    continue
+
+                zinfo = zipfile.ZipInfo(file_name, date_time=get_zip_date_time(obj))
+                zinfo.compress_type = zipfile.ZIP_DEFLATED
+                force_zip64 = obj.get('bytes', 0) >= ZIP64_THRESHOLD
+                if isinstance(content, bytes):
+                    chunks = (content[start:start + ZIP_CHUNK_SIZE] for start in range(0, len(content), ZIP_CHUNK_SIZE))
+                else:
+                    chunks = content.iter_content(chunk_size=ZIP_CHUNK_SIZE)
+                try:
+                    with zf.open(zinfo, 'w', force_zip64=force_zip64) as entry:
+                        for chunk in chunks:
+                            entry.write(chunk)
+                            data = buffer.pop()
+                            if data:
+                                yield data
+                finally:
+                    if not isinstance(content, bytes):
+                        content.close()
+                yield buffer.pop()
+
+            # Los archivos que no se pudieron descargar se reportan dentro del mismo zip
+            if errors:
+                print(f"Errores al generar el zip: {errors}")
+                zf.writestr("errores.txt", "\n".join(errors))
+        yield buffer.pop()
+    finally:
+        # Si el cliente corta la descarga se descartan las descargas pendientes
+        for _, future in pending:
+            if future:
+                future.cancel()
+        executor.shutdown(wait=False)
 
+#Eliminar carpeta y su contenido de un contenedor en openstack 
+#los SLO se eliminan con sus segmentos, salvo los que regrese shared_segments (función que recibe los nombres de los SLO)
+#regresa el resultado por objeto: {"deleted": [...], "errors": [{"name": ..., "status": ...}]}
+def delete_path_openstack(user, user_scope, project, file_path, shared_segments=None):
+    try:
         # Obtener la lista de archivos en un directorio
         objects = get_object_list_by_path(user, project, file_path)
-        # objects = objects.get('data', [])
-        
+
         if not objects:
             raise Exception("No se encontraron archivos en el directorio especificado.")
-        # print("objects", objects)
-        #imprimir con formato json
-        print(json.dumps(objects, indent=4))
-        # Iterar sobre los archivos y descargarlos
-        for obj in objects:
-            file_name = obj['name'].lstrip("/\\")
-            url = f"http://192.168.1.104:8080/v1/{user_scope}/{user}//{file_name}"
-            print('\nurl: ',url)
-
-            headers = {'X-Auth-Token': token}
-
-            # Solicitar el archivo al servidor
-            response = requests.delete(url, headers=headers, stream=True)
-            print(response.status_code)
-            if response.status_code == 200 or response.status_code == 204:
-
-                print(f"Archivo '{file_name}' eliminado exitosamente")
-            else:
-                print(f"Error al eliminar '{file_name}': {response.status_code} - {response.text}")
+        print(f"Objetos a eliminar en '{file_path}': {len(objects)}")
+
+        manifests = {obj['name'] for obj in objects if 'slo_etag' in obj}
+        if manifests and shared_segments:
+            manifests -= set(shared_segments(list(manifests)))
+        result = bulk_delete_objects(user, user_scope, project, [obj['name'] for obj in objects], manifests=manifests)
+        print(f"Archivos eliminados: {len(result['deleted'])}, errores: {len(result['errors'])}")
+        return result
     except Exception as e:
-        print(f"Error en el proceso de eliminacion: {e}")
\ No newline at end of file
+        print(f"Error en el proceso de eliminacion: {e}")
+        return {"deleted": [], "errors": [{"name": file_path, "status": str(e)}]}
@@ -5,9 +5,24 @@ import posixpath
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required
 import requests, json
-from .auth import openstack_auth_id
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, unquote
+from .client import CONTROLLER_URL, SWIFT_URL, http_session
+from .auth import swift_request
 openstack_auth_bp = Blueprint('openstack', __name__)
 
+# Entradas por pagina al listar una sola carpeta
+DIRECTORY_PAGE_SIZE = 1000
+# Maximo de objetos por peticion de bulk-delete si swift no lo informa
+BULK_DELETE_MAX = 10000
+# Eliminaciones individuales al mismo tiempo cuando swift no tiene bulk-delete
+DELETE_WORKERS = 8
+# Copias al mismo tiempo al mover una carpeta
+MOVE_WORKERS = 8
+
+# Informacion de los middlewares de swift (GET /info), se consulta una sola vez
+_swift_info = {}
+
 #obtener lista de objetos de un contenedor
 def get_object_list(user_id, project_id):
 
@@ -15,13 +30,18 @@ def get_object_list(user_id, project_id):
     data = {"user_id": user_id, "project": project_id}
     print("data", data)
     try:
-        response = requests.get(fetch_url, json=data)
+        response = http_session.get(fetch_url, json=data)
         
         # Verifica si la respuesta fue exitosa (código 200)
         response.raise_for_status()  # Lanza una excepción si la respuesta tiene un error
 
+        # Un listado que falló a la mitad llega con "error" y no se debe usar
+        listing = response.json()
+        if 'error' in listing:
+            raise Exception(listing['error'])
+
         # Retorna el contenido de la respuesta
-        return response.json()  # Usar .json() si la respuesta es en JSON, .text si es texto plano
+        return listing  # Usar .json() si la respuesta es en JSON, .text si es texto plano
     except requests.exceptions.HTTPError as errh:
         print("Error HTTP:", errh)
     except requests.exceptions.ConnectionError as errc:
@@ -38,13 +58,18 @@ def get_object_list_by_path(user_id, project_id, path):
     data = {"user_id": user_id, "project": project_id, "path": path}
     try:
         print("entro a get_object_by_path", data)
-        response = requests.post(fetch_url, json=data)
+        response = http_session.post(fetch_url, json=data)
         
         # Verifica si la respuesta fue exitosa (código 200)
         response.raise_for_status()  # Lanza una excepción si la respuesta tiene un error
 
+        # Un listado que falló a la mitad llega con "error" y no se debe usar
+        listing = response.json()
+        if 'error' in listing:
+            raise Exception(listing['error'])
+
         #obtener user_info de response
-        user_info = response.json()['data']
+        user_info = listing['data']
         # print("user_info", user_info)
         # Retorna el contenido de la respuesta
         return user_info  # Usar .json() si la respuesta es en JSON, .text si es texto plano
@@ -58,10 +83,200 @@ def get_object_list_by_path(user_id, project_id, path):
         print("Error en la petición:", err)
     return response.json()
 
-def delete(user, user_scope, project, file_path, file_name):
-    token = openstack_auth_id(str(user), project)
+#obtener una pagina del listado de un contenedor que empieza con prefix
+#regresa la pagina y el marker para pedir la siguiente (None si ya no hay mas)
+def get_object_page_by_path(user_id, project_id, prefix, delimiter=None, marker=None, limit=DIRECTORY_PAGE_SIZE):
+    fetch_url = f"{CONTROLLER_URL}/object/path"
+    data = {"user_id": user_id, "project": project_id, "path": prefix, "limit": limit}
+    if delimiter:
+        data["delimiter"] = delimiter
+    if marker:
+        data["marker"] = marker
+    response = http_session.post(fetch_url, json=data)
+    response.raise_for_status()
+    page = response.json()
+    if 'data' not in page:
+        raise Exception(page.get('error', 'Error al listar objetos'))
+    return page['data'], page.get('next_marker')
+
+#recorrer el listado completo de un contenedor pagina por pagina
+def iter_object_pages(user_id, project_id, prefix="", marker=None, limit=DIRECTORY_PAGE_SIZE):
+    while True:
+        page, marker = get_object_page_by_path(user_id, project_id, prefix, marker=marker, limit=limit)
+        if page:
+            yield page
+        if not marker:
+            return
+
+#listar solo los hijos inmediatos de una carpeta usando prefix y delimiter='/'
+#los objetos pueden estar guardados con o sin '/' inicial, por lo que se consultan ambos prefijos
+#y se mezclan en orden; el marker se maneja sin la barra inicial
+#regresa las entradas de swift (objetos y {"subdir": ...}) con el nombre sin barra inicial y el siguiente marker
+def get_directory_children(user_id, project_id, path, marker=None, limit=DIRECTORY_PAGE_SIZE):
+    path = path.strip("/")
+    prefix = path + "/" if path else ""
+
+    # Si el marker es una subcarpeta se salta todo su contenido pidiendo desde "x/\uffff"
+    # (con "x0" swift omitiria un objeto llamado exactamente "x0"); un nombre dentro de la
+    # subcarpeta que ordene despues de "\uffff" volveria como la misma subcarpeta y se omite abajo
+    after = marker
+    if marker and marker.endswith("/"):
+        marker = marker + "\uffff"
+
+    entries = {}
+    # Nombre hasta el que ambos prefijos estan completos, lo que sigue se pide en la siguiente pagina
+    cutoff = None
+    for lead in ["", "/"]:
+        # Se pide una entrada extra porque cada prefijo puede traer una que se omite
+        page, next_marker = get_object_page_by_path(user_id, project_id, lead + prefix, "/",
+                                                    lead + marker if marker else None, limit + 1)
+        last = None
+        for entry in page:
+            name = entry.get("subdir", entry.get("name", "")).lstrip("/")
+            # Se omiten el marcador de la misma carpeta, el grupo de objetos con barra inicial
+            # y lo que ya se entregó en paginas anteriores
+            if not name or name == prefix or (after and name <= after):
+                continue
+            if "subdir" in entry:
+                entry = {"subdir": name}
+            else:
+                entry = dict(entry, name=name)
+            entries.setdefault(name, entry)
+            last = name
+        if next_marker is not None and last is not None:
+            cutoff = last if cutoff is None else min(cutoff, last)
+
+    names = sorted(entries)
+    more = cutoff is not None
+    if more:
+        names = [name for name in names if name <= cutoff]
+    if len(names) > limit:
+        names = names[:limit]
+        more = True
+    next_marker = names[-1] if more and names else None
+    return [entries[name] for name in names], next_marker
+
+#obtener la informacion de swift para saber si tiene el middleware de bulk-delete
+def get_swift_info():
+    if not _swift_info:
+        try:
+            response = http_session.get(f"{SWIFT_URL}/info")
+            if response.status_code == 200:
+                _swift_info.update(response.json())
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print("Error al obtener la informacion de swift:", e)
+    return _swift_info
+
+#eliminar un solo objeto, regresa el codigo de estado de swift
+#container permite eliminar en otro contenedor del usuario (por ejemplo el de segmentos)
+#manifest elimina un SLO junto con sus segmentos (multipart-manifest=delete)
+def delete_object(user, user_scope, project, object_name, container=None, manifest=False):
+    url = f"{SWIFT_URL}/v1/{user_scope}/{container or user}/{quote(object_name)}"
+    params = {'multipart-manifest': 'delete'} if manifest else None
+    response = swift_request('DELETE', url, user, project, params=params)
+    return response.status_code
+
+#consultar los metadatos de un objeto con HEAD, regresa las cabeceras o None si no existe
+#container permite consultar otro contenedor de la misma cuenta
+def head_object(user, user_scope, project, object_name, container=None):
+    url = f"{SWIFT_URL}/v1/{user_scope}/{container or user}/{quote(object_name)}"
+    response = swift_request('HEAD', url, user, project)
+    if response.status_code not in [200, 204]:
+        return None
+    return response.headers
+
+#obtener los segmentos ("/contenedor/segmento") a los que apunta un SLO leyendo su manifiesto (multipart-manifest=get)
+#regresa un conjunto vacio si el objeto no existe o no es un SLO y None si no se pudo leer
+def get_slo_segments(user, user_scope, project, object_name, container=None):
+    url = f"{SWIFT_URL}/v1/{user_scope}/{container or user}/{quote(object_name)}"
+    try:
+        response = swift_request('GET', url, user, project, params={'multipart-manifest': 'get'})
+        if response.status_code == 404:
+            return set()
+        if response.status_code != 200:
+            print(f"Error al leer el manifiesto de '{object_name}': {response.status_code}")
+            return None
+        if response.headers.get('X-Static-Large-Object') != 'True':
+            return set()
+        return {segment['name'] for segment in response.json()}
+    except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as e:
+        print(f"Error al leer el manifiesto de '{object_name}': {e}")
+        return None
+
+#eliminar objetos uno por uno en paralelo, los nombres en manifests se eliminan con sus segmentos
+def delete_objects_concurrently(user, user_scope, project, object_names, container=None, manifests=()):
+    result = {"deleted": [], "errors": []}
+    with ThreadPoolExecutor(max_workers=DELETE_WORKERS) as executor:
+        futures = {executor.submit(delete_object, user, user_scope, project, name, container, name in manifests): name for name in object_names}
+        for future, name in futures.items():
+            try:
+                status = future.result()
+                # 404 indica que el objeto ya no existe, el resultado es el mismo
+                if status in [200, 204, 404]:
+                    result["deleted"].append(name)
+                else:
+                    result["errors"].append({"name": name, "status": status})
+            except Exception as e:
+                result["errors"].append({"name": name, "status": str(e)})
+    return result
+
+#eliminar objetos del contenedor con el middleware bulk-delete de swift, en lotes
+#si swift no tiene bulk-delete se eliminan uno por uno en paralelo
+#bulk-delete solo elimina el manifiesto de un SLO, los nombres en manifests se eliminan aparte junto con sus segmentos
+def bulk_delete_objects(user, user_scope, project, object_names, container=None, manifests=None):
+    container = container or user
+    if manifests:
+        manifests = set(manifests)
+        result = delete_objects_concurrently(user, user_scope, project, [name for name in object_names if name in manifests], container, manifests)
+        rest = bulk_delete_objects(user, user_scope, project, [name for name in object_names if name not in manifests], container)
+        result["deleted"].extend(rest["deleted"])
+        result["errors"].extend(rest["errors"])
+        return result
+
+    bulk_info = get_swift_info().get('bulk_delete')
+    if not bulk_info:
+        print("Swift no tiene bulk-delete, se eliminaran los objetos uno por uno")
+        return delete_objects_concurrently(user, user_scope, project, object_names, container)
+
+    max_deletes = bulk_info.get('max_deletes_per_request', BULK_DELETE_MAX)
+    url = f"{SWIFT_URL}/v1/{user_scope}"
+    headers = {'Content-Type': 'text/plain', 'Accept': 'application/json'}
+    result = {"deleted": [], "errors": []}
+
+    for start in range(0, len(object_names), max_deletes):
+        batch = object_names[start:start + max_deletes]
+        # Cada linea es /contenedor/objeto codificado como url
+        body = "\n".join(quote(f"/{container}/{name}") for name in batch)
+        response = swift_request('POST', url, user, project, params={'bulk-delete': ''}, headers=headers, data=body.encode('utf-8'))
+        try:
+            bulk_result = response.json() if response.status_code == 200 else {}
+        except ValueError:
+            bulk_result = {}
+        # bulk-delete responde 200 aunque el lote falle, el resultado real viene en "Response Status" (por ejemplo "400 Bad Request")
+        # si el lote no se completó se eliminan uno por uno, un 404 cuenta como eliminado
+        if not str(bulk_result.get('Response Status', '')).startswith('2'):
+            print(f"Error en bulk-delete: {response.status_code} - {response.text}")
+            batch_result = delete_objects_concurrently(user, user_scope, project, batch, container)
+            result["deleted"].extend(batch_result["deleted"])
+            result["errors"].extend(batch_result["errors"])
+            continue
+
+        # Swift solo regresa los objetos que fallaron (codificados como url), los demas se eliminaron
+        failed = {}
+        for path, status in bulk_result.get('Errors', []):
+            failed[unquote(path).lstrip('/')] = status
+        for name in batch:
+            status = failed.get(f"{container}/{name}")
+            if status is None:
+                result["deleted"].append(name)
+            else:
+                result["errors"].append({"name": name, "status": status})
+    return result
+
+#eliminar un archivo, si es un SLO tambien se eliminan sus segmentos
+#keep_segments conserva los segmentos cuando otro objeto apunta a ellos (copias por contenido)
+def delete(user, user_scope, project, file_path, file_name, keep_segments=False):
     print(project)
-    print(token)
     print("file_path_recibido", file_path)
     print("file_name_recibido", file_name)
     # print("full_path_recibido", full_path)
@@ -76,22 +291,24 @@ def delete(user, user_scope, project, file_path, file_name):
     else:
         url = f"http://192.168.1.104:8080/v1/{user_scope}/{user}{file_name}"
     print(url)
-    headers = {
-        'X-Auth-Token': token,
-    }
 
-    response = requests.delete(url, headers=headers)
+    params = None
+    if not keep_segments:
+        head = swift_request('HEAD', url, user, project)
+        if head.headers.get('X-Static-Large-Object') == 'True':
+            params = {'multipart-manifest': 'delete'}
+
+    response = swift_request('DELETE', url, user, project, params=params)
     # response = requests.get(url, headers=headers)
 
-    if response.status_code not in [201, 202, 204]:
+    # La eliminacion de un SLO con sus segmentos responde 200
+    if response.status_code not in [200, 201, 202, 204]:
         raise Exception(f"Error al subir el objeto: {response.status_code} - {response.text}")
     else:
         print(f"Objeto '{file_name}' subido exitosamente a '{user}'.")
         return jsonify({"message": f"Objeto '{file_name}' subido exitosamente a '{user}'."}), 201
     
 def move_data(user, user_scope, project, file_path, file_name, new_path):
-    token = openstack_auth_id(str(user), project)
-    print(token)
     print("file_path_recibido", file_path)
     print("file_name_recibido", file_name)
     # print("full_path_recibido", full_path)
@@ -119,19 +336,19 @@ def move_data(user, user_scope, project, file_path, file_name, new_path):
     # url = f"http://192.168.1.104:8080/v1/{user_scope}/{user}{file_path}"
     print(url)
     headers = {
-        'X-Auth-Token': token,
         'Destination': f'/{user}/{directorio_generado}'  # Nuevo nombre del objeto dentro del contenedor
     }
 
+    # De un SLO solo se copia el manifiesto, el original se elimina sin sus segmentos
+    head = swift_request('HEAD', url, user, project)
+    params = {'multipart-manifest': 'get'} if head.headers.get('X-Static-Large-Object') == 'True' else None
+
     # Realizar la solicitud COPY
-    response = requests.request('COPY', url, headers=headers)
+    response = swift_request('COPY', url, user, project, headers=headers, params=params)
     # response = requests.get(url, headers=headers)
     print("response: ",response)
     # url = f"http://192.168.1.104:8080/v1/{user_scope}/{user}{file_path}"
-    headers = {
-        'X-Auth-Token': token,
-    } 
-    response2 = requests.delete(url, headers=headers)
+    response2 = swift_request('DELETE', url, user, project)
     print("response2: ",response2)  
     # response = requests.get(url, headers=headers)
     print("response: ",response)
@@ -142,101 +359,96 @@ def move_data(user, user_scope, project, file_path, file_name, new_path):
         print(f"Objeto '{file_name}' subido exitosamente a '{user}'.")
         return jsonify({"message": f"Objeto '{file_name}' subido exitosamente a '{user}'."}), 201
     
+#calcular el nombre destino de un objeto de la carpeta que se mueve
+def get_move_destination(file_name, source_path, new_path):
+    # Obtener el nombre de la carpeta que se está moviendo (path2)
+    carpeta_mover = PurePosixPath(os.path.basename(os.path.normpath(source_path)))
+
+    # Convertir las cadenas de ruta a objetos PurePosixPath
+    file_path = PurePosixPath('/') / file_name
+    source_path_obj = PurePosixPath(source_path)
+    if not source_path_obj.is_absolute():
+        source_path_obj = PurePosixPath('/') / source_path_obj
+
+    # Verificar si file_path está efectivamente bajo source_path_obj
+    try:
+        ruta_relativa = file_path.relative_to(source_path_obj)
+    except ValueError:
+        # Si file_path no está bajo source_path_obj se usará solo el nombre del archivo
+        ruta_relativa = PurePosixPath(file_path.name)
+
+    # Generar la nueva ruta virtual, las carpetas virtuales conservan la barra final
+    directorio_generado = str(PurePosixPath(new_path) / carpeta_mover / ruta_relativa)
+    if file_name.endswith("/"):
+        directorio_generado += "/"
+    return directorio_generado
+
+#copiar un objeto a su nuevo nombre y verificar la copia
+#de un SLO solo se copia el manifiesto (multipart-manifest=get), la copia apunta a los mismos segmentos
+def copy_object(user, user_scope, project, obj, destination):
+    file_name = obj['name'].lstrip("/\\")
+    url = f"{SWIFT_URL}/v1/{user_scope}/{user}//{file_name}"
+    headers = {
+        'Destination': f'/{user}/{destination}'  # Nuevo nombre del objeto dentro del contenedor
+    }
+    is_manifest = 'slo_etag' in obj
+    params = {'multipart-manifest': 'get'} if is_manifest else None
+    # Realizar la solicitud COPY
+    response = swift_request('COPY', url, user, project, headers=headers, params=params)
+    if response.status_code not in [201, 202]:
+        raise Exception(f"{response.status_code} - {response.text}")
+
+    if is_manifest:
+        # El ETag de la copia es el del manifiesto, se verifica con un HEAD que regresa el ETag y el tamaño del SLO
+        copied = head_object(user, user_scope, project, destination)
+        etag = (copied.get('Etag') or '').strip('"') if copied is not None else None
+        if copied is None or etag != obj['slo_etag'].strip('"') or int(copied.get('Content-Length', -1)) != obj.get('bytes'):
+            raise Exception(f"La copia del SLO no coincide con el original ({etag} != {obj['slo_etag']})")
+        return
+
+    # El ETag de la copia debe coincidir con el hash del objeto original
+    etag = (response.headers.get('Etag') or '').strip('"')
+    if obj.get('hash') and etag and etag != obj['hash']:
+        raise Exception(f"La copia no coincide con el original ({etag} != {obj['hash']})")
+
+#mover una carpeta: copia todos los objetos en paralelo y solo despues elimina los originales con bulk-delete
+#regresa {"moved": [...], "errors": [{"name": ..., "status": ...}]}
 def move_path_to_path(user, user_scope, project, source_path, new_path):
-    token = openstack_auth_id(str(user), project)
-    print(token)
-    # print("full_path_recibido", full_path)
     print("source_path", source_path)
     print("new_path", new_path)
-    
 
-    # url = f"192.168.1.104:5000/v1/{user}/{object_name}"
-# Obtener la lista de archivos en un directorio
+    # Obtener la lista de archivos en un directorio
     objects = get_object_list_by_path(user, project, source_path)
-    # objects = objects.get('data', [])
-    
+
     if not objects:
         raise Exception("No se encontraron archivos en el directorio especificado.")
-    
-    # print("objects", objects)
-    #imprimir con formato json
-    print(json.dumps(objects, indent=4))
-    # Obtener el nombre de la carpeta que se está moviendo (path2)
-    carpeta_mover = os.path.basename(os.path.normpath(source_path))  # 'path2'
+    print(f"Objetos a mover: {len(objects)}")
 
-    # Iterar sobre los archivos y descargarlos
-    
-    for obj in objects:
+    result = {"moved": [], "errors": []}
+    copied = []
+    with ThreadPoolExecutor(max_workers=MOVE_WORKERS) as executor:
+        futures = {}
+        for obj in objects:
+            destination = get_move_destination(obj['name'].lstrip("/\\"), source_path, new_path)
+            futures[executor.submit(copy_object, user, user_scope, project, obj, destination)] = obj['name']
 
-        file_name = obj['name'].lstrip("/\\")
-        
-        url = f"http://192.168.1.104:8080/v1/{user_scope}/{user}//{file_name}"
-        print('\nurl: ',url)
-
-        # Convertir las cadenas de ruta a objetos PurePosixPath
-        file_path = PurePosixPath(file_name)
-        new_path_obj = PurePosixPath(new_path)
-        source_path_obj = PurePosixPath(source_path)
-        carpeta_mover_obj = PurePosixPath(carpeta_mover)
-        
-        # Asegurar que file_path y source_path_obj sean rutas absolutas
-        if not file_path.is_absolute():
-            file_path = PurePosixPath('/') / file_path
-        if not source_path_obj.is_absolute():
-            source_path_obj = PurePosixPath('/') / source_path_obj
-        
-        # Extraer el nombre del archivo
-        nombre_archivo = file_path.name
-        print("nombre_archivo:", nombre_archivo)
-        print("file_name:", file_path)
-        print("new_path:", new_path_obj)
-        print("source_path:", source_path_obj)
-        
-        # Verificar si file_path está efectivamente bajo source_path_obj
-        try:
-            ruta_relativa = file_path.relative_to(source_path_obj)
-            print(f"Ruta relativa: {ruta_relativa}")
-        except ValueError:
-            # Si file_path no está bajo source_path_obj, manejar el error según sea necesario
-            print("Error: 'file_name' no está bajo 'source_path'. Se usará solo el nombre del archivo.")
-            ruta_relativa = nombre_archivo
-        
+        for processed, (future, name) in enumerate(futures.items(), start=1):
+            try:
+                future.result()
+                copied.append(name)
+            except Exception as e:
+                print(f"Error al copiar '{name}': {e}")
+                result["errors"].append({"name": name, "status": str(e)})
+            print(f"Progreso de copia: {processed}/{len(futures)}")
 
-        # Generar la nueva ruta virtual
-        #contiene una extencion
-        if "." in file_path.name:
-            directorio_generado = new_path_obj / carpeta_mover_obj / ruta_relativa
-        else:
-            directorio_generado = new_path_obj / carpeta_mover_obj 
-            directorio_generado = str(directorio_generado) + "/"
-        print(f"Directorio generado: {directorio_generado}")
-
-        headers = {
-        'X-Auth-Token': token,
-        'Destination': f'/{user}/{directorio_generado}'  # Nuevo nombre del objeto dentro del contenedor
-        }
-        # Realizar la solicitud COPY
-        response = requests.request('COPY', url, headers=headers)
-        # response = requests.get(url, headers=headers)
-        print("response: ",response)
-        # url = f"http://192.168.1.104:8080/v1/{user_scope}/{user}{file_path}"
-        headers = {
-            'X-Auth-Token': token,
-        } 
-        response2 = requests.delete(url, headers=headers)
-        print("response2: ",response2)  
-        # Solicitar el archivo al servidor
-        print(response.status_code)
-        if response.status_code == 200 or response.status_code == 204:
-            print(f"Archivo '{file_name}' eliminado exitosamente")
-        else:
-            print(f"Error al eliminar '{file_name}': {response.status_code} - {response.text}")
-    
-    # response = requests.get(url, headers=headers)
-    print("response: ",response)
-    if response.status_code not in [201, 202, 204]:
-        print(response.text)
-        raise Exception(f"Error al subir el objeto: {response.status_code} - {response.text}")
-    else:
-        print(f"Objeto '{file_name}' subido exitosamente a '{user}'.")
-        return jsonify({"message": f"Objeto '{file_name}' subido exitosamente a '{user}'."}), 201
\ No newline at end of file
+    # Solo se eliminan los objetos cuya copia se verificó
+    if copied:
+        # Los objetos se eliminan con el mismo nombre con el que se copiaron
+        delete_result = bulk_delete_objects(user, user_scope, project, ['/' + name.lstrip("/\\") for name in copied])
+        result["moved"] = delete_result["deleted"]
+        result["errors"].extend(delete_result["errors"])
+
+    print(f"Objetos movidos: {len(result['moved'])}, errores: {len(result['errors'])}")
+    if not result["moved"]:
+        raise Exception(f"No se pudo mover la carpeta: {result['errors']}")
+    return result
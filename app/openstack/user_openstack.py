@@ -2,6 +2,7 @@
 from flask import Blueprint
 from flask_jwt_extended import jwt_required
 import requests, json
+from .client import http_session
 
 
 #peticion a la api de openstack para crear un usuario
@@ -13,7 +14,7 @@ def create_user(user_id, role):
         fetch_url = "http://localhost:10000/user/teacher"
     data = {"student_id": user_id}
     try:
-        response = requests.post(fetch_url, json=data)
+        response = http_session.post(fetch_url, json=data)
         
         # Verifica si la respuesta fue exitosa (código 200)
         response.raise_for_status()  # Lanza una excepción si la respuesta tiene un error
@@ -37,7 +38,7 @@ def create_academy_openstack(user_id):
     try:
         fetch_url = "http://localhost:10000/user/academy"
         data = {"academy_id": user_id}
-        response = requests.post(fetch_url, json=data)
+        response = http_session.post(fetch_url, json=data)
         
         # Verifica si la respuesta fue exitosa (código 200)
         response.raise_for_status()  # Lanza una excepción si la respuesta tiene un error
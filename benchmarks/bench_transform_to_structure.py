@@ -0,0 +1,118 @@
+#micro-benchmark de transform_to_structure con listados sinteticos
+#uso: python benchmarks/bench_transform_to_structure.py [numero_de_objetos]
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.file.path_functions import transform_to_structure
+
+# Objetos del listado sintetico por defecto
+DEFAULT_OBJECTS = 100000
+# Objetos con los que se compara contra la version anterior (cuadratica)
+COMPARE_OBJECTS = 20000
+
+#generar un listado con el formato de "openstack object list --long"
+def synthetic_listing(count, seed=0):
+    rng = random.Random(seed)
+    listing = []
+    for i in range(count):
+        # Una carpeta de entregas con miles de subcarpetas, como la de una materia con muchos alumnos
+        depth = rng.randint(0, 3)
+        folders = ["entregas", f"alumno{rng.randint(0, count // 10)}"] + [f"tarea{rng.randint(0, 10)}" for _ in range(depth)]
+        is_dir = rng.random() < 0.05
+        name = "/".join(folders + [f"archivo{i}.pdf"]) if not is_dir else "/".join(folders + [f"vacia{i}"]) + "/"
+        listing.append({
+            "Name": "/" + name,
+            "Bytes": rng.randint(0, 50 * 1024 * 1024),
+            "Hash": "",
+            "Content Type": "application/pdf",
+            "Last Modified": datetime(2024, rng.randint(1, 12), rng.randint(1, 28), 10, 30).isoformat(),
+        })
+    return listing
+
+#version anterior de transform_to_structure, solo para comprobar que el resultado es el mismo
+def transform_to_structure_legacy(data):
+    structure = {}
+
+    # Procesar los datos
+    for item in data:
+        if not all(key in item for key in ["Name", "Last Modified", "Bytes"]):
+            continue
+
+        # Normalizar el nombre del archivo/carpeta
+        name = item["Name"].strip("/")  # Eliminar las barras iniciales y finales
+        is_dir = item["Name"].endswith("/")  # Detectar si es un directorio basado en la barra final
+        parts = name.split("/")
+
+        current_path = "/".join(parts)
+        parent_path = "/".join(parts[:-1]) if len(parts) > 1 else ""
+
+        # Asegurar que los directorios padres existan en la estructura
+        for i in range(1, len(parts)):  # Comenzamos desde 1 para evitar incluir el nivel raíz
+            folder_path = "/".join(parts[:i])  # Carpeta actual en el camino
+            if folder_path not in structure:
+                structure[folder_path] = {"files": [], "folders": []}
+
+            # Agregar la carpeta actual al directorio padre
+            parent = "/".join(parts[:i-1]) if i > 1 else ""  # Directorio padre
+            if parent and folder_path not in structure[parent]["folders"]:
+                structure[parent]["folders"].append(folder_path)
+
+        # Si es un directorio, lo agregamos sin archivos
+        if is_dir:
+            if current_path not in structure:
+                structure[current_path] = {"files": [], "folders": []}
+            # Asegurarnos de agregar el directorio vacío como una carpeta de su directorio padre
+            if parent_path and current_path not in structure[parent_path]["folders"]:
+                structure[parent_path]["folders"].append(current_path)
+            continue
+        else:
+            # Si es un archivo, agregamos la información
+            try:
+                file_info = {
+                    "date": datetime.fromisoformat(item["Last Modified"]).strftime("%Y/%m/%d"),
+                    "path": current_path,
+                    "size": round(item["Bytes"] / 1024, 2)  # Convertir bytes a kilobytes
+                }
+                if parent_path not in structure:
+                    structure[parent_path] = {"files": [], "folders": []}
+                structure[parent_path]["files"].append(file_info)
+            except ValueError:
+                print(f"Formato de fecha inválido en {item['Last Modified']}")
+
+    # Asegurarse de que las carpetas principales estén en la raíz
+    root_folders = set(folder.split("/")[0] for folder in structure if "/" in folder or folder)
+    if "" not in structure:
+        structure[""] = {"files": [], "folders": []}
+    structure[""]["folders"].extend(folder for folder in root_folders if folder not in structure[""]["folders"])
+
+    return structure
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_OBJECTS
+
+    # Comprobar que la salida es identica a la de la version anterior
+    sample = synthetic_listing(COMPARE_OBJECTS, seed=1)
+    assert transform_to_structure(sample) == transform_to_structure_legacy(sample), "La estructura no coincide con la version anterior"
+
+    start = time.perf_counter()
+    legacy = transform_to_structure_legacy(sample)
+    legacy_time = time.perf_counter() - start
+    start = time.perf_counter()
+    transform_to_structure(sample)
+    new_time = time.perf_counter() - start
+    print(f"{COMPARE_OBJECTS} objetos: anterior {legacy_time:.3f}s, actual {new_time:.3f}s")
+
+    listing = synthetic_listing(count)
+    start = time.perf_counter()
+    structure = transform_to_structure(listing)
+    elapsed = time.perf_counter() - start
+    print(f"{count} objetos: {elapsed:.3f}s ({len(structure)} carpetas)")
+
+
+if __name__ == '__main__':
+    main()